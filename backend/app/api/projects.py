@@ -1,34 +1,463 @@
 """
 Projects API endpoints
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, Any, Literal
+import asyncio
+import base64
+import binascii
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from msgspec import UNSET
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Literal, Optional
+from app.core.config import settings
+from app.core.json_codec import FastJSONResponse
+from app.core.metrics import ServerTiming
+from app.services.columnar_store import to_micros
 from app.services.s3_service import s3_service
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
+
+
+class MapIdsRequest(BaseModel):
+    """Request body for the batch map id lookup"""
+    project_ids: List[str] = Field(..., alias="projectIds", description="Ids of the selected projects")
+
+
+def _encode_cursor(etag: str, sort_by: str, direction: str, start: int) -> str:
+    """Encode a pagination cursor tied to the dump and sort order it was issued for"""
+    raw = f"{etag}:{sort_by}:{direction}:{start}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str, etag: str, sort_by: str, direction: str) -> int:
+    """
+    Decode a pagination cursor back into the rank to resume from
+    
+    Raises:
+        HTTPException: 400 for malformed cursors or a different sort order,
+            409 when the cursor was issued for an older dump
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        cursor_etag, cursor_sort_by, cursor_direction, start = raw.rsplit(':', 3)
+        start = int(start)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if (cursor_sort_by, cursor_direction) != (sort_by, direction) or start < 0:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    if cursor_etag != etag:
+        raise HTTPException(status_code=409, detail="Cursor refers to an older dump, restart from the first page")
+    return start
+
+
+def _cache_status(from_cache: bool, stale: bool) -> str:
+    """Cache status of a served cache entry: HIT, STALE or MISS"""
+    return "STALE" if stale else "HIT" if from_cache else "MISS"
+
+
+def _cache_status_headers(entry: Dict[str, Any], from_cache: bool, stale: bool) -> Dict[str, str]:
+    """Headers describing how fresh a served cache entry is"""
+    return {
+        "X-Cache": _cache_status(from_cache, stale),
+        "Age": str(int(s3_service.age_seconds(entry))),
+        "X-Checked-At": datetime.fromtimestamp(entry['checked_at'], timezone.utc).isoformat()
+    }
+
+
+def _validator_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+    """ETag, Last-Modified and Cache-Control headers for a cached dump"""
+    return {
+        # Weak, since the same dump is served with different content codings
+        "ETag": f'W/"{entry["etag"]}"',
+        "Last-Modified": format_datetime(entry['last_modified'].astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": settings.PROJECTS_CACHE_CONTROL
+    }
+
+
+def _server_timing_headers(timing: ServerTiming, result: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """
+    Server-Timing header with the phases of a request and the cache status it was served with
+    
+    Without a successful cache lookup result, the cache status is reported as ERROR.
+    """
+    succeeded = result is not None and result["success"]
+    timing.describe("cache", _cache_status(result["fromCache"], result["stale"]) if succeeded else "ERROR")
+    return {"Server-Timing": timing.header()}
+
+
+def _unset_as_none(value: Any) -> Any:
+    """Report export fields the dump left out as null"""
+    return None if value is UNSET else value
+
+
+def _is_not_modified(request: Request, entry: Dict[str, Any]) -> bool:
+    """
+    Check a request's If-None-Match / If-Modified-Since against a cached dump
+    
+    If-None-Match takes precedence and uses weak comparison; If-Modified-Since
+    is only considered when it is absent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(
+            (tag[2:] if tag.startswith("W/") else tag) == f'"{entry["etag"]}"' for tag in tags
+        )
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return entry['last_modified'].replace(microsecond=0) <= since
+    
+    return False
 
 
 @router.get("/projects", response_model=Dict[str, Any])
-async def get_projects(environment: Literal["local", "production"] = Query("local", description="Environment to fetch data from")):
+async def get_projects(
+    request: Request,
+    environment: Literal["local", "production"] = Query("local", description="Environment to fetch data from")
+):
     """
     Get all projects from the latest S3 ridership modeling file.
     
+    The body is encoded and compressed once per dump and served as-is, with
+    the best Content-Encoding the client accepts. Cache status and staleness
+    are reported in the X-Cache, Age and X-Checked-At headers, and the time
+    spent in each phase of the request in Server-Timing. Requests whose
+    If-None-Match or If-Modified-Since still match the dump get a 304.
+    
     Args:
         environment: The environment to fetch data from (local = staging bucket, production = production bucket)
     
     Returns:
         Dict containing success status and project data
     """
+    timing = ServerTiming()
+    try:
+        result = await s3_service.get_cache_entry(environment, timing)
+        
+        if not result["success"]:
+            raise HTTPException(
+                status_code=500,
+                detail=result.get("error", "Unknown error occurred"),
+                headers=_server_timing_headers(timing, result)
+            )
+        
+        entry = result["entry"]
+        headers = _cache_status_headers(entry, result["fromCache"], result["stale"])
+        headers.update(_validator_headers(entry))
+        headers["Vary"] = "Accept-Encoding"
+        
+        if _is_not_modified(request, entry):
+            headers.update(_server_timing_headers(timing, result))
+            return Response(status_code=304, headers=headers)
+        
+        encoding, body = entry['body'].negotiate(request.headers.get("accept-encoding"))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        headers.update(_server_timing_headers(timing, result))
+        return Response(content=body, media_type="application/json", headers=headers)
+        
+    except HTTPException:
+        # Re-raise HTTPExceptions as-is
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching projects: {str(e)}",
+            headers=_server_timing_headers(timing)
+        ) 
+
+
+@router.get("/projects/query", response_model=Dict[str, Any])
+async def query_projects(
+    environment: Literal["local", "production"] = Query("local", description="Environment to fetch data from"),
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of projects to return"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    sort_by: Literal["name", "agency", "author", "created_at", "updated_at"] = Query("updated_at", description="Field to sort by"),
+    direction: Literal["asc", "desc"] = Query("desc", description="Sort direction"),
+    agency_id: Optional[str] = Query(None, description="Only include projects of this agency"),
+    author_id: Optional[str] = Query(None, description="Only include projects by this author"),
+    created_after: Optional[datetime] = Query(None, description="Only include projects created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only include projects created at or before this time"),
+    updated_after: Optional[datetime] = Query(None, description="Only include projects updated at or after this time"),
+    updated_before: Optional[datetime] = Query(None, description="Only include projects updated at or before this time")
+):
+    """
+    Get one page of unique projects, filtered and sorted on the server.
+    
+    Pages are served from indexes built once per dump, so the payload only
+    grows with the page size rather than with the whole export.
+    
+    Returns:
+        Dict containing success status, the page of projects and the cursor of the next page
+    """
+    timing = ServerTiming()
+    try:
+        result = await s3_service.get_cache_entry(environment, timing)
+        
+        if not result["success"]:
+            raise HTTPException(
+                status_code=500,
+                detail=result.get("error", "Unknown error occurred"),
+                headers=_server_timing_headers(timing, result)
+            )
+        
+        entry = result["entry"]
+        try:
+            start = _decode_cursor(cursor, entry['etag'], sort_by, direction) if cursor else 0
+        except HTTPException as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=e.detail,
+                headers=_server_timing_headers(timing, result)
+            ) from e
+        with timing.phase("query"):
+            page = entry['index'].query(
+                sort_by=sort_by,
+                direction=direction,
+                start=start,
+                limit=limit,
+                agency_id=agency_id,
+                author_id=author_id,
+                created_after=to_micros(created_after),
+                created_before=to_micros(created_before),
+                updated_after=to_micros(updated_after),
+                updated_before=to_micros(updated_before)
+            )
+        
+        with timing.phase("encode"):
+            response = FastJSONResponse({
+                "success": True,
+                "data": {
+                    "projects": page['projects'],
+                    "totalCount": page['total'],
+                    "nextCursor": _encode_cursor(entry['etag'], sort_by, direction, page['next']) if page['next'] is not None else None,
+                    "lastModified": entry['last_modified'].isoformat(),
+                    "sourceFile": entry['key'],
+                    "fromCache": result["fromCache"],
+                    "stale": result["stale"]
+                }
+            })
+        response.headers.update(_server_timing_headers(timing, result))
+        return response
+        
+    except HTTPException:
+        # Re-raise HTTPExceptions as-is
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error querying projects: {str(e)}",
+            headers=_server_timing_headers(timing)
+        )
+
+
+
+@router.get("/projects/changes", response_model=Dict[str, Any])
+async def get_project_changes(
+    since: str = Query(..., description="ETag of the dump the client holds, or an ISO 8601 time (e.g. its exported_at)"),
+    environment: Literal["local", "production"] = Query("local", description="Environment to fetch data from")
+):
+    """
+    Get the jobs and unique projects added, modified and removed since an earlier dump.
+    
+    Served from the retained history of recent dumps, so clients holding a
+    recent export can patch it instead of downloading the whole dump. If the
+    history does not reach back far enough a 410 is returned and the client
+    should reload /api/projects.
+    
+    Returns:
+        Dict containing success status, the changes and the ETag of the current dump
+    """
+    timing = ServerTiming()
+    try:
+        result = await s3_service.get_cache_entry(environment, timing)
+        
+        if not result["success"]:
+            raise HTTPException(
+                status_code=500,
+                detail=result.get("error", "Unknown error occurred"),
+                headers=_server_timing_headers(timing, result)
+            )
+        
+        entry = result["entry"]
+        with timing.phase("changes"):
+            changes = s3_service.get_changes(environment, since)
+        if changes is None:
+            raise HTTPException(
+                status_code=410,
+                detail=f"No changes retained since {since}, reload the full export",
+                headers=_server_timing_headers(timing, result)
+            )
+        
+        store = entry['store']
+        headers = _cache_status_headers(entry, result["fromCache"], result["stale"])
+        headers.update(_validator_headers(entry))
+        with timing.phase("encode"):
+            response = FastJSONResponse({
+                "success": True,
+                "data": {
+                    "since": since,
+                    "etag": entry['etag'],
+                    "exportedAt": _unset_as_none(store.exported_at),
+                    "totalJobs": _unset_as_none(store.total_jobs),
+                    "totalUniqueProjects": _unset_as_none(store.total_unique_projects),
+                    "lastModified": entry['last_modified'].isoformat(),
+                    "sourceFile": entry['key'],
+                    "projects": changes['projects'],
+                    "jobs": changes['jobs']
+                }
+            }, headers=headers)
+        response.headers.update(_server_timing_headers(timing, result))
+        return response
+        
+    except HTTPException:
+        # Re-raise HTTPExceptions as-is
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching project changes: {str(e)}",
+            headers=_server_timing_headers(timing)
+        )
+
+
+@router.get("/projects/events")
+async def stream_project_events(
+    request: Request,
+    environment: Literal["local", "production"] = Query("local", description="Environment to watch")
+):
+    """
+    Stream a Server-Sent Event whenever a new dump is loaded.
+    
+    Each 'dump' event carries the key, ETag and record counts of the new
+    dump and, for small deltas, the changed records. The current dump is
+    sent on connect so reconnecting clients notice anything they missed.
+    Comments are sent as keepalives while nothing happens.
+    """
+    async def stream():
+        queue = s3_service.events.subscribe(environment)
+        try:
+            yield b"retry: 5000\n\n"
+            current = s3_service.dump_event(environment)
+            if current is not None:
+                yield current
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    message = b": keepalive\n\n"
+                yield message
+        finally:
+            s3_service.events.unsubscribe(environment, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/projects/{project_id}/jobs", response_model=Dict[str, Any])
+async def get_project_jobs(
+    project_id: str,
+    environment: Literal["local", "production"] = Query("local", description="Environment to fetch data from")
+):
+    """
+    Get the ridership modeling jobs and map ids of a single project.
+    
+    Returns:
+        Dict containing success status, the project's jobs and its distinct map ids
+    """
+    timing = ServerTiming()
+    try:
+        result = await s3_service.get_cache_entry(environment, timing)
+        
+        if not result["success"]:
+            raise HTTPException(
+                status_code=500,
+                detail=result.get("error", "Unknown error occurred"),
+                headers=_server_timing_headers(timing, result)
+            )
+        
+        index = result["entry"]['index']
+        if not index.has_project(project_id):
+            raise HTTPException(
+                status_code=404,
+                detail=f"Project not found: {project_id}",
+                headers=_server_timing_headers(timing, result)
+            )
+        
+        with timing.phase("query"):
+            jobs = index.jobs_for_project(project_id)
+            map_ids = index.map_ids_for_projects([project_id])
+        with timing.phase("encode"):
+            response = FastJSONResponse({
+                "success": True,
+                "data": {
+                    "projectId": project_id,
+                    "jobs": jobs,
+                    "mapIds": map_ids
+                }
+            })
+        response.headers.update(_server_timing_headers(timing, result))
+        return response
+        
+    except HTTPException:
+        # Re-raise HTTPExceptions as-is
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching project jobs: {str(e)}",
+            headers=_server_timing_headers(timing)
+        )
+
+
+@router.post("/map-ids", response_model=Dict[str, Any])
+async def get_map_ids(
+    request: MapIdsRequest,
+    environment: Literal["local", "production"] = Query("local", description="Environment to fetch data from")
+):
+    """
+    Get the distinct map ids used by the jobs of a batch of projects.
+    
+    Returns:
+        Dict containing success status and the sorted, de-duplicated map ids
+    """
+    timing = ServerTiming()
     try:
-        result = await s3_service.get_latest_data(environment)
+        result = await s3_service.get_cache_entry(environment, timing)
         
         if not result["success"]:
             raise HTTPException(
                 status_code=500,
-                detail=result.get("error", "Unknown error occurred")
+                detail=result.get("error", "Unknown error occurred"),
+                headers=_server_timing_headers(timing, result)
             )
         
-        return result
+        with timing.phase("query"):
+            map_ids = result["entry"]['index'].map_ids_for_projects(request.project_ids)
+        with timing.phase("encode"):
+            response = FastJSONResponse({
+                "success": True,
+                "data": {
+                    "mapIds": map_ids
+                }
+            })
+        response.headers.update(_server_timing_headers(timing, result))
+        return response
         
     except HTTPException:
         # Re-raise HTTPExceptions as-is
@@ -36,5 +465,6 @@ async def get_projects(environment: Literal["local", "production"] = Query("loca
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error fetching projects: {str(e)}"
-        ) 
\ No newline at end of file
+            detail=f"Error fetching map ids: {str(e)}",
+            headers=_server_timing_headers(timing)
+        )
@@ -19,6 +19,75 @@ class Settings(BaseSettings):
     S3_BUCKET_NAME: str = "citymapper-cfc-ridership-modeling-eu-west-1-"
     S3_FILE_PREFIX: str = "ridership_modeling_dumps/"
     S3_FILE_PATTERN: str = "ridership_modeling_jobs_"
+    # S3-compatible endpoint to use instead of AWS (e.g. a local stand-in), empty for AWS
+    S3_ENDPOINT_URL: str = ""
+    # Resume listings from the last known dump key instead of scanning the whole prefix
+    S3_LIST_FROM_LAST_KEY: bool = True
+    
+    # S3 connection pool settings (clients are long-lived, one per environment)
+    S3_MAX_POOL_CONNECTIONS: int = 10
+    S3_KEEPALIVE_TIMEOUT: float = 60.0
+    
+    # Parse dumps incrementally from a single GET while they download (requires
+    # ijson). Lowers peak memory for large dumps, but parses several times slower,
+    # on the event loop, and rules out ranged downloads
+    S3_STREAMING_PARSE: bool = False
+    S3_STREAM_CHUNK_SIZE: int = 65536
+    # Dumps larger than one part are downloaded as parallel byte ranges (keep the
+    # concurrency within S3_MAX_POOL_CONNECTIONS; 1 disables ranged downloads)
+    S3_DOWNLOAD_PART_SIZE: int = 8 * 1024 * 1024
+    S3_DOWNLOAD_CONCURRENCY: int = 8
+    # Dumps are decoded and indexed on this many worker threads so the event loop
+    # keeps serving requests meanwhile (0 does the work on the event loop)
+    DUMP_WORKER_THREADS: int = 2
+    
+    # JSON backend for encoding responses: auto, orjson, msgspec or json
+    # (dumps are always decoded with msgspec)
+    JSON_CODEC: str = "auto"
+    
+    # Compression of the pre-encoded /api/projects body (gzip 0 / brotli -1 disables a variant)
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 5
+    # Cache-Control sent with /api/projects; clients revalidate with ETag / Last-Modified
+    PROJECTS_CACHE_CONTROL: str = "no-cache"
+    
+    # Background refresh interval for the cached dumps (0 disables the refresher)
+    S3_REFRESH_INTERVAL_SECONDS: float = 60.0
+    # Fetch every environment's latest dump at startup when the refresher is disabled
+    S3_PREFETCH_ON_STARTUP: bool = True
+    
+    # Serve cached dumps immediately and revalidate them in the background,
+    # as long as they were confirmed against S3 within the maximum staleness
+    S3_STALE_WHILE_REVALIDATE: bool = True
+    S3_MAX_STALENESS_SECONDS: float = 3600.0
+    # Cached dumps count as fresh for one refresh interval, or for this long
+    # when the background refresher is disabled
+    S3_FRESHNESS_SECONDS: float = 60.0
+    
+    # Parsed dumps are persisted here so restarts don't re-download them
+    DISK_CACHE_ENABLED: bool = True
+    DISK_CACHE_DIR: str = ".cache/dumps"
+    # Workers sharing the directory download each dump once and map its encoded bodies
+    DISK_CACHE_SHARE_BODIES: bool = True
+    DISK_CACHE_LOCK_TIMEOUT_SECONDS: float = 300.0
+    
+    # New dumps are diffed against the cached one by job/project id and, when few
+    # enough rows changed, only the delta is applied to the store and indexes
+    DELTA_INGESTION_ENABLED: bool = True
+    DELTA_MAX_CHANGED_FRACTION: float = 0.25
+    # Number of dump-to-dump deltas kept per environment
+    DELTA_HISTORY_SIZE: int = 10
+    
+    # Server-Sent Events pushed to dashboards when a new dump is loaded
+    EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    EVENTS_QUEUE_SIZE: int = 16
+    # Changed records are only attached to an event when there are at most this many
+    EVENTS_MAX_DELTA_RECORDS: int = 200
+    
+    # Expose Prometheus metrics at /metrics
+    METRICS_ENABLED: bool = True
+    # How often the event loop's lag is sampled for /metrics (0 disables sampling)
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
     
     # CORS settings
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
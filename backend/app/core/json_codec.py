@@ -0,0 +1,93 @@
+"""
+JSON encoding with optional fast backends
+
+Responses are encoded with msgspec, orjson when installed, or the standard
+library, chosen with the JSON_CODEC setting. Dumps are always decoded with
+msgspec, straight into the typed export structs (see app.models.ridership).
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Tuple
+import msgspec
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Preference order when JSON_CODEC is "auto"; msgspec encodes the export structs natively
+_AUTO_ORDER = ('msgspec', 'orjson', 'json')
+
+
+def _default(obj: Any) -> Any:
+    """Encode values the selected encoder does not handle natively"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, msgspec.Struct):
+        return msgspec.to_builtins(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+_msgspec_encoder = msgspec.json.Encoder(enc_hook=_default)
+
+
+def _msgspec_dumps(obj: Any) -> bytes:
+    return _msgspec_encoder.encode(obj)
+
+
+_BACKENDS: Dict[str, Callable[[Any], bytes]] = {
+    'json': _json_dumps,
+    'msgspec': _msgspec_dumps
+}
+if orjson is not None:
+    _BACKENDS['orjson'] = _orjson_dumps
+
+
+def available_backends() -> List[str]:
+    """Get the names of the installed JSON backends, fastest first"""
+    return [name for name in _AUTO_ORDER if name in _BACKENDS]
+
+
+def get_backend(name: str = 'auto') -> Tuple[str, Callable[[Any], bytes]]:
+    """
+    Resolve a JSON backend by name
+
+    Args:
+        name: 'auto', 'orjson', 'msgspec' or 'json'
+
+    Returns:
+        Tuple of the resolved backend name and its dumps function.
+        Unavailable backends fall back to the fastest installed one.
+    """
+    if name not in _BACKENDS:
+        if name != 'auto':
+            print(f"JSON backend '{name}' is not installed, falling back to the fastest available one")
+        name = available_backends()[0]
+    return name, _BACKENDS[name]
+
+
+BACKEND, _dumps = get_backend(settings.JSON_CODEC)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode an object as compact UTF-8 JSON bytes with the configured backend"""
+    return _dumps(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with the configured backend instead of the stdlib"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
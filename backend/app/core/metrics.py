@@ -0,0 +1,353 @@
+"""
+Lightweight in-process metrics rendered in the Prometheus text format
+
+Counters, gauges and histograms are plain dictionaries keyed by label
+values behind a lock, so recording a sample costs a dictionary lookup and
+a bisect and can stay enabled under load.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Default histogram buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Buckets for payload sizes, in bytes
+SIZE_BUCKETS = tuple(float(1024 * 4 ** i) for i in range(11))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Base class holding a metric's name, help text and label names"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """Value per label set that can go up and down"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values per label set, in cumulative buckets"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (plus one for +Inf), sum and count
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock duration of a block, in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+registry = Registry()
+
+
+class ServerTiming:
+    """
+    Durations of the phases of a single request, reported in a Server-Timing header
+
+    Passed down the call chain serving a request; phases recorded more than
+    once (e.g. several LIST pages) are summed.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._durations: Dict[str, float] = {}
+        self._descriptions: Dict[str, str] = {}
+
+    def add(self, name: str, seconds: float, description: Optional[str] = None) -> None:
+        """Add time spent in a phase"""
+        self._durations[name] = self._durations.get(name, 0.0) + seconds
+        if description is not None:
+            self._descriptions[name] = description
+
+    @contextmanager
+    def phase(self, name: str, description: Optional[str] = None) -> Iterator[None]:
+        """Time a block as a phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, description)
+
+    def describe(self, name: str, description: str) -> None:
+        """Report a named value without a duration, e.g. the cache status"""
+        self._descriptions[name] = description
+
+    def duration(self, name: str) -> Optional[float]:
+        return self._durations.get(name)
+
+    def durations(self) -> Dict[str, float]:
+        """Seconds spent in each phase recorded so far"""
+        return dict(self._durations)
+
+    def header(self) -> str:
+        """
+        Render the Server-Timing header value, ending with the total time so far
+
+        Returns:
+            e.g. 's3-list;dur=12.1, s3-get;dur=840.6, cache;desc="MISS", total;dur=1203.4'
+        """
+        entries = []
+        for name in [*self._durations, *(name for name in self._descriptions if name not in self._durations)]:
+            entry = name
+            if name in self._durations:
+                entry += f";dur={self._durations[name] * 1000:.1f}"
+            if name in self._descriptions:
+                entry += f';desc="{_escape(self._descriptions[name])}"'
+            entries.append(entry)
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ', '.join(entries)
+
+
+def phase(timing: Optional[ServerTiming], name: str, description: Optional[str] = None) -> ContextManager[None]:
+    """Time a block as a phase of timing, if a request is being timed"""
+    return timing.phase(name, description) if timing is not None else nullcontext()
+
+
+async def watch_event_loop_lag(interval: float) -> None:
+    """
+    Record how late the event loop wakes up a task sleeping for interval seconds, until cancelled
+
+    The delay is how long a request arriving at that moment would have waited
+    for work blocking the loop, such as decoding a dump on it.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Metrics of the S3-backed dump cache
+S3_REQUEST_SECONDS = histogram(
+    'project_explorer_s3_request_duration_seconds',
+    "Duration of S3 requests, including reading the response body",
+    ('operation', 'environment')
+)
+S3_REQUEST_ERRORS = counter(
+    'project_explorer_s3_request_errors_total',
+    "S3 requests that failed",
+    ('operation', 'environment')
+)
+S3_BYTES_DOWNLOADED = counter(
+    'project_explorer_s3_downloaded_bytes_total',
+    "Bytes of dump objects downloaded from S3",
+    ('environment',)
+)
+DUMP_SIZE_BYTES = histogram(
+    'project_explorer_dump_size_bytes',
+    "Size of the dump objects fetched from S3",
+    ('environment',),
+    SIZE_BUCKETS
+)
+DUMP_DECODE_SECONDS = histogram(
+    'project_explorer_dump_decode_duration_seconds',
+    "Time spent decoding and validating dump JSON (streamed dumps are parsed while they download)",
+    ('environment', 'mode')
+)
+DUMP_BUILD_SECONDS = histogram(
+    'project_explorer_dump_build_duration_seconds',
+    "Time spent building a cache entry's store, indexes and encoded body",
+    ('environment', 'mode')
+)
+RESPONSE_ENCODE_SECONDS = histogram(
+    'project_explorer_response_encode_duration_seconds',
+    "Time spent serializing and compressing pre-encoded response bodies",
+    ('coding',)
+)
+RESPONSE_BODY_BYTES = histogram(
+    'project_explorer_response_body_bytes',
+    "Size of pre-encoded response bodies",
+    ('coding',),
+    SIZE_BUCKETS
+)
+CACHE_REQUESTS = counter(
+    'project_explorer_cache_requests_total',
+    "Cache lookups by result: hit, stale, miss or error",
+    ('environment', 'result')
+)
+COALESCED_REQUESTS = counter(
+    'project_explorer_coalesced_requests_total',
+    "Requests that waited for a dump download already in progress",
+    ('environment',)
+)
+DUMP_RECORDS = gauge(
+    'project_explorer_dump_records',
+    "Live records in the cached dump",
+    ('environment', 'kind')
+)
+DUMP_LAST_MODIFIED = gauge(
+    'project_explorer_dump_last_modified_timestamp_seconds',
+    "When the cached dump was written to S3",
+    ('environment',)
+)
+
+# Responsiveness of the server process
+EVENT_LOOP_LAG_SECONDS = histogram(
+    'project_explorer_event_loop_lag_seconds',
+    "How late the event loop ran a task past its scheduled time",
+    (),
+    (0.0005,) + DURATION_BUCKETS
+)
@@ -1,17 +1,42 @@
 """
 FastAPI application main module
 """
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.projects import router as projects_router
+from app.core import metrics
 from app.core.config import settings
+from app.services.s3_service import s3_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the pooled S3 clients and start warming the caches, then tear both down"""
+    lag_watcher = None
+    if settings.METRICS_ENABLED and settings.EVENT_LOOP_LAG_INTERVAL_SECONDS > 0:
+        lag_watcher = asyncio.create_task(metrics.watch_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS))
+    await s3_service.start()
+    s3_service.start_refresher()
+    s3_service.start_prefetch()
+    try:
+        yield
+    finally:
+        await s3_service.stop_refresher()
+        await s3_service.close()
+        if lag_watcher is not None:
+            lag_watcher.cancel()
+            await asyncio.gather(lag_watcher, return_exceptions=True)
+
 
 app = FastAPI(
     title="Project Explorer API",
     description="API for exploring project data from S3",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -21,6 +46,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Age", "ETag", "Server-Timing", "X-Cache", "X-Checked-At"],
 )
 
 # Include routers
@@ -29,4 +55,11 @@ app.include_router(projects_router, prefix="/api", tags=["projects"])
 @app.get("/")
 async def root():
     """Root endpoint for health check"""
-    return {"message": "Project Explorer API is running"} 
\ No newline at end of file
+    return {"message": "Project Explorer API is running"} 
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Prometheus metrics for S3 requests, dump ingestion, response encoding and the cache"""
+        return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,84 @@
+"""
+Typed models for the ridership modeling export
+
+Mirrors the interfaces in frontend/src/types/api.ts. Dumps are decoded and
+validated into these structs once when they are loaded, and responses are
+encoded straight from them. Fields the export may omit default to UNSET so
+they are left out of responses exactly as they were left out of the dump;
+fields not declared here are dropped at load time.
+"""
+from typing import List, Optional, Union
+import msgspec
+from msgspec import UNSET, UnsetType
+
+
+class RequestPayload(msgspec.Struct, gc=False):
+    """Parameters a ridership modeling job was requested with"""
+    map_type: Union[str, None, UnsetType] = UNSET
+    project_id: Union[str, None, UnsetType] = UNSET
+    baseline_project_id: Union[str, None, UnsetType] = UNSET
+    map_id: Union[str, None, UnsetType] = UNSET
+    service_period_id: Union[str, None, UnsetType] = UNSET
+
+
+class JobResult(msgspec.Struct, gc=False):
+    """Outputs of a ridership modeling job"""
+    bytes: Union[int, float, None, UnsetType] = UNSET
+    run_id: Union[str, None, UnsetType] = UNSET
+    status: Union[str, None, UnsetType] = UNSET
+    triggered: Union[bool, None, UnsetType] = UNSET
+    results_od: Union[str, None, UnsetType] = UNSET
+    results_stops: Union[str, None, UnsetType] = UNSET
+    results_routes: Union[str, None, UnsetType] = UNSET
+
+
+class RidershipJob(msgspec.Struct, gc=False):
+    """A completed ridership modeling job"""
+    id: str
+    type: Union[str, None, UnsetType] = UNSET
+    status: Union[str, None, UnsetType] = UNSET
+    user_id: Union[int, str, None, UnsetType] = UNSET
+    map_id: Union[str, None, UnsetType] = UNSET
+    request_payload: Union[RequestPayload, None, UnsetType] = UNSET
+    result: Union[JobResult, None, UnsetType] = UNSET
+    created_at: Union[str, None, UnsetType] = UNSET
+    updated_at: Union[str, None, UnsetType] = UNSET
+
+    @property
+    def project_id(self) -> Optional[str]:
+        """Id of the project the job was run for"""
+        return self.request_payload.project_id or None if self.request_payload else None
+
+
+class UniqueProject(msgspec.Struct, gc=False):
+    """A project that has at least one ridership modeling job"""
+    id: str
+    name: Union[str, None, UnsetType] = UNSET
+    agency_id: Union[str, None, UnsetType] = UNSET
+    agency_name: Union[str, None, UnsetType] = UNSET
+    author_id: Union[int, str, None, UnsetType] = UNSET
+    author_name: Union[str, None, UnsetType] = UNSET
+    created_at: Union[str, None, UnsetType] = UNSET
+    updated_at: Union[str, None, UnsetType] = UNSET
+
+
+class RidershipExport(msgspec.Struct, gc=False):
+    """Envelope of a ridership_modeling_jobs_YYYYMMDD_HHMMSS.json dump"""
+    exported_at: Union[str, None, UnsetType] = UNSET
+    total_jobs: Union[int, None, UnsetType] = UNSET
+    total_unique_projects: Union[int, None, UnsetType] = UNSET
+    jobs: List[RidershipJob] = msgspec.field(default_factory=list)
+    unique_projects: List[UniqueProject] = msgspec.field(default_factory=list)
+
+
+_export_decoder = msgspec.json.Decoder(RidershipExport)
+
+
+def decode_export(data: bytes) -> RidershipExport:
+    """
+    Decode and validate a dump in one pass
+
+    Raises:
+        ValueError: If the data is not valid JSON or does not match the export schema
+    """
+    return _export_decoder.decode(data)
@@ -0,0 +1,429 @@
+"""
+Columnar, array-backed in-memory store for the projects and jobs of a dump
+"""
+import copy
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+import msgspec
+from app.models.ridership import RequestPayload, RidershipExport, RidershipJob, UniqueProject
+
+# Stored for timestamps that are missing or not valid ISO 8601, sorts before all others
+MISSING_TIMESTAMP = -(2 ** 63)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Fields of RequestPayload, in the order they are packed into a tuple
+_PAYLOAD_FIELDS = RequestPayload.__struct_fields__
+
+_fingerprint_encoder = msgspec.msgpack.Encoder()
+
+
+def fingerprint(record: msgspec.Struct) -> int:
+    """64-bit hash of a record's content, used to spot records that changed between dumps"""
+    return hash(_fingerprint_encoder.encode(record))
+
+
+def parse_micros(value: Any) -> Optional[int]:
+    """
+    Convert an ISO 8601 timestamp from the dump into microseconds since the epoch
+
+    Args:
+        value: Timestamp string such as '2025-01-01T12:00:00Z' (naive values are UTC)
+
+    Returns:
+        Microseconds since the epoch, or None if the value is missing or invalid
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def to_micros(value: Optional[datetime]) -> Optional[int]:
+    """Convert a query datetime (naive values are UTC) into microseconds since the epoch"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class CodedColumn:
+    """
+    Dictionary-encoded column: each distinct value is stored once and rows
+    hold its integer code
+    """
+
+    def __init__(self, values: Iterable[Any] = ()):
+        self.dictionary: List[Any] = []
+        self.codes = array('l')
+        self._code_of: Dict[Any, int] = {}
+        self.extend(values)
+
+    def encode(self, value: Any) -> int:
+        """Get the code of a value, adding it to the dictionary if it is new"""
+        code = self._code_of.get(value)
+        if code is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = len(self.dictionary)
+            self._code_of[value] = code
+            self.dictionary.append(value)
+        return code
+
+    def append(self, value: Any) -> None:
+        code = self._code_of.get(value)
+        self.codes.append(self.encode(value) if code is None else code)
+
+    def extend(self, values: Iterable[Any]) -> None:
+        code_of = self._code_of
+        self.codes.extend([
+            code if (code := code_of.get(value)) is not None else self.encode(value)
+            for value in values
+        ])
+
+    def copy(self) -> 'CodedColumn':
+        column = copy.copy(self)
+        column.dictionary = self.dictionary.copy()
+        column.codes = self.codes[:]
+        column._code_of = self._code_of.copy()
+        return column
+
+    def __getitem__(self, row: int) -> Any:
+        return self.dictionary[self.codes[row]]
+
+    def __setitem__(self, row: int, value: Any) -> None:
+        self.codes[row] = self.encode(value)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class TimestampColumn:
+    """
+    ISO 8601 timestamps stored as int64 microseconds since the epoch.
+
+    Values are formatted back in the style of the first full timestamp of
+    the column; the few that would not come back byte for byte (other
+    offsets, precisions or layouts, invalid or missing values) are also kept
+    verbatim.
+    """
+
+    def __init__(self, values: Iterable[Any] = ()):
+        self.micros = array('q')
+        self._verbatim: Dict[int, Any] = {}
+        self._fraction_digits: Optional[int] = None
+        self._timespec = 'seconds'
+        self._suffix = 'Z'
+        # Length of the values that format back byte for byte, None if none do
+        self._length: Optional[int] = None
+        self.extend(values)
+
+    def _learn_format(self, value: str) -> None:
+        """Pick the fraction precision and UTC suffix the dump formats timestamps with"""
+        rest = value[19:]
+        digits = 0
+        if rest.startswith('.'):
+            digits = len(rest) - 1 - len(rest[1:].lstrip('0123456789'))
+            rest = rest[1 + digits:]
+        self._fraction_digits = digits
+        self._timespec = {0: 'seconds', 3: 'milliseconds'}.get(digits, 'microseconds')
+        self._suffix = rest
+        # Finer fractions than microseconds cannot be rebuilt from micros
+        self._length = len(value) if digits <= 6 else None
+
+    def _format_moment(self, moment: datetime) -> str:
+        text = moment.isoformat(timespec=self._timespec)
+        if self._fraction_digits not in (0, 3, 6):
+            text = text[:20 + self._fraction_digits]
+        return text + self._suffix
+
+    def _is_canonical(self, value: str) -> bool:
+        """Check that a valid timestamp is formatted exactly like _format_moment() would"""
+        return (
+            len(value) == self._length and value[4] == '-' and value[7] == '-' and value[10] == 'T'
+            and value[13] == ':' and value[16] == ':' and value.endswith(self._suffix)
+            and (not self._fraction_digits or value[19] == '.')
+        )
+
+    def _format(self, micros: int) -> str:
+        return self._format_moment(_NAIVE_EPOCH + timedelta(microseconds=micros))
+
+    def _encode(self, row: int, value: Any) -> int:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            self._verbatim[row] = value
+            return MISSING_TIMESTAMP
+
+        offset = parsed.utcoffset()
+        if offset is not None:
+            micros = (parsed - _EPOCH) // _MICROSECOND
+        else:
+            micros = (parsed - _NAIVE_EPOCH) // _MICROSECOND
+        if self._fraction_digits is None and len(value) >= 19 and value[10] == 'T':
+            self._learn_format(value)
+
+        # Only UTC values laid out exactly like the column's format can be rebuilt from micros
+        if offset or not self._is_canonical(value):
+            self._verbatim[row] = value
+        else:
+            self._verbatim.pop(row, None)
+        return micros
+
+    def append(self, value: Any) -> None:
+        self.micros.append(self._encode(len(self.micros), value))
+
+    def extend(self, values: Iterable[Any]) -> None:
+        encode = self._encode
+        self.micros.extend([encode(row, value) for row, value in enumerate(values, len(self.micros))])
+
+    def copy(self) -> 'TimestampColumn':
+        column = copy.copy(self)
+        column.micros = self.micros[:]
+        column._verbatim = self._verbatim.copy()
+        return column
+
+    def __getitem__(self, row: int) -> Any:
+        value = self._verbatim.get(row, self)
+        return self._format(self.micros[row]) if value is self else value
+
+    def __setitem__(self, row: int, value: Any) -> None:
+        self.micros[row] = self._encode(row, value)
+
+    def __len__(self) -> int:
+        return len(self.micros)
+
+
+class RecordTable:
+    """
+    Row bookkeeping shared by the project and job tables.
+
+    Rows are addressed by position. Records removed by a later dump are
+    tombstoned rather than deleted so positions held by indexes stay valid;
+    live_positions() skips them.
+    """
+
+    # Names of the per-row value columns a subclass stores, copied by copy()
+    _columns: Tuple[str, ...] = ()
+
+    def _init_rows(self, records: List[Any]) -> None:
+        self.ids: List[str] = [sys.intern(record.id) for record in records]
+        self.position: Dict[str, int] = {record_id: position for position, record_id in enumerate(self.ids)}
+        self.fingerprints = array('q', [fingerprint(record) for record in records])
+        self.live = bytearray(b'\x01') * len(records)
+        self.removed = 0
+
+    def _append_values(self, record: Any) -> None:
+        raise NotImplementedError
+
+    def _set_values(self, position: int, record: Any) -> None:
+        raise NotImplementedError
+
+    def copy(self) -> 'RecordTable':
+        """Copy the table so a delta can be applied without touching this one"""
+        table = copy.copy(self)
+        table.ids = self.ids.copy()
+        table.position = self.position.copy()
+        table.fingerprints = self.fingerprints[:]
+        table.live = self.live[:]
+        for name in self._columns:
+            setattr(table, name, getattr(self, name).copy())
+        return table
+
+    def append(self, record: Any) -> None:
+        record_id = sys.intern(record.id)
+        self.position[record_id] = len(self.ids)
+        self.ids.append(record_id)
+        self.fingerprints.append(fingerprint(record))
+        self.live.append(1)
+        self._append_values(record)
+
+    def replace(self, position: int, record: Any) -> None:
+        """Overwrite the record stored at a row position"""
+        self.fingerprints[position] = fingerprint(record)
+        self._set_values(position, record)
+
+    def remove(self, position: int) -> None:
+        """Tombstone the record stored at a row position"""
+        if self.live[position]:
+            self.live[position] = 0
+            self.removed += 1
+            del self.position[self.ids[position]]
+
+    def live_positions(self) -> Iterable[int]:
+        """Row positions of the records that have not been removed, in order"""
+        if not self.removed:
+            return range(len(self.ids))
+        return [position for position, alive in enumerate(self.live) if alive]
+
+    def __len__(self) -> int:
+        """Number of live records"""
+        return len(self.ids) - self.removed
+
+
+class ProjectTable(RecordTable):
+    """
+    The unique projects of a dump as columns.
+
+    Agencies and authors are dictionary-encoded as (id, name) pairs and
+    timestamps are int64 arrays; row() rebuilds a project for serialization.
+    """
+
+    _columns = ('names', 'agency', 'author', 'created_at', 'updated_at')
+
+    def __init__(self, projects: Iterable[UniqueProject] = ()):
+        projects = list(projects)
+        self._init_rows(projects)
+        self.names: List[Any] = [project.name for project in projects]
+        self.agency = CodedColumn((project.agency_id, project.agency_name) for project in projects)
+        self.author = CodedColumn((project.author_id, project.author_name) for project in projects)
+        self.created_at = TimestampColumn(project.created_at for project in projects)
+        self.updated_at = TimestampColumn(project.updated_at for project in projects)
+
+    def _append_values(self, project: UniqueProject) -> None:
+        self.names.append(project.name)
+        self.agency.append((project.agency_id, project.agency_name))
+        self.author.append((project.author_id, project.author_name))
+        self.created_at.append(project.created_at)
+        self.updated_at.append(project.updated_at)
+
+    def _set_values(self, position: int, project: UniqueProject) -> None:
+        self.names[position] = project.name
+        self.agency[position] = (project.agency_id, project.agency_name)
+        self.author[position] = (project.author_id, project.author_name)
+        self.created_at[position] = project.created_at
+        self.updated_at[position] = project.updated_at
+
+    def row(self, position: int) -> UniqueProject:
+        """Rebuild the project stored at a row position"""
+        agency_id, agency_name = self.agency[position]
+        author_id, author_name = self.author[position]
+        return UniqueProject(
+            id=self.ids[position],
+            name=self.names[position],
+            agency_id=agency_id,
+            agency_name=agency_name,
+            author_id=author_id,
+            author_name=author_name,
+            created_at=self.created_at[position],
+            updated_at=self.updated_at[position]
+        )
+
+    def rows(self, positions: Iterable[int]) -> List[UniqueProject]:
+        return [self.row(position) for position in positions]
+
+
+class JobTable(RecordTable):
+    """
+    The jobs of a dump as columns.
+
+    Types, statuses, users, map ids and whole request payloads repeat across
+    jobs and are dictionary-encoded; results are unique per job and kept as
+    structs. row() rebuilds a job for serialization.
+    """
+
+    _columns = ('type', 'status', 'user_id', 'map_id', 'request_payload', 'results', 'created_at', 'updated_at')
+
+    def __init__(self, jobs: Iterable[RidershipJob] = ()):
+        jobs = list(jobs)
+        self._init_rows(jobs)
+        self.type = CodedColumn(job.type for job in jobs)
+        self.status = CodedColumn(job.status for job in jobs)
+        self.user_id = CodedColumn(job.user_id for job in jobs)
+        self.map_id = CodedColumn(job.map_id for job in jobs)
+        self.request_payload = CodedColumn(self._pack_payload(job.request_payload) for job in jobs)
+        self.results: List[Any] = [job.result for job in jobs]
+        self.created_at = TimestampColumn(job.created_at for job in jobs)
+        self.updated_at = TimestampColumn(job.updated_at for job in jobs)
+
+    @staticmethod
+    def _pack_payload(payload: Any) -> Any:
+        if isinstance(payload, RequestPayload):
+            return tuple(getattr(payload, field) for field in _PAYLOAD_FIELDS)
+        return payload
+
+    def _append_values(self, job: RidershipJob) -> None:
+        self.type.append(job.type)
+        self.status.append(job.status)
+        self.user_id.append(job.user_id)
+        self.map_id.append(job.map_id)
+        self.request_payload.append(self._pack_payload(job.request_payload))
+        self.results.append(job.result)
+        self.created_at.append(job.created_at)
+        self.updated_at.append(job.updated_at)
+
+    def _set_values(self, position: int, job: RidershipJob) -> None:
+        self.type[position] = job.type
+        self.status[position] = job.status
+        self.user_id[position] = job.user_id
+        self.map_id[position] = job.map_id
+        self.request_payload[position] = self._pack_payload(job.request_payload)
+        self.results[position] = job.result
+        self.created_at[position] = job.created_at
+        self.updated_at[position] = job.updated_at
+
+    def project_id(self, position: int) -> Optional[str]:
+        """Id of the project the job at a row position was run for"""
+        payload = self.request_payload[position]
+        return payload[1] or None if isinstance(payload, tuple) else None
+
+    def row(self, position: int) -> RidershipJob:
+        """Rebuild the job stored at a row position"""
+        payload = self.request_payload[position]
+        if isinstance(payload, tuple):
+            payload = RequestPayload(*payload)
+        return RidershipJob(
+            id=self.ids[position],
+            type=self.type[position],
+            status=self.status[position],
+            user_id=self.user_id[position],
+            map_id=self.map_id[position],
+            request_payload=payload,
+            result=self.results[position],
+            created_at=self.created_at[position],
+            updated_at=self.updated_at[position]
+        )
+
+    def rows(self, positions: Iterable[int]) -> List[RidershipJob]:
+        return [self.row(position) for position in positions]
+
+
+class ColumnarExport:
+    """
+    A dump held as a project table and a job table instead of one struct
+    per record, several times smaller for large exports.
+    """
+
+    def __init__(self, data: RidershipExport):
+        self.exported_at = data.exported_at
+        self.total_jobs = data.total_jobs
+        self.total_unique_projects = data.total_unique_projects
+        self.projects = ProjectTable(data.unique_projects)
+        self.jobs = JobTable(data.jobs)
+
+    def to_export(self) -> RidershipExport:
+        """Rebuild the whole dump, e.g. to serialize it"""
+        return RidershipExport(
+            exported_at=self.exported_at,
+            total_jobs=self.total_jobs,
+            total_unique_projects=self.total_unique_projects,
+            jobs=self.jobs.rows(self.jobs.live_positions()),
+            unique_projects=self.projects.rows(self.projects.live_positions())
+        )
+
+    def copy(self) -> 'ColumnarExport':
+        """Copy the store so a delta can be applied while readers keep using this one"""
+        store = copy.copy(self)
+        store.projects = self.projects.copy()
+        store.jobs = self.jobs.copy()
+        return store
@@ -0,0 +1,316 @@
+"""
+On-disk cache of parsed dumps for fast cold starts, shared between worker processes
+"""
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Iterable, Iterator
+import msgspec
+from app.models.ridership import RidershipExport
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks (e.g. Windows), every worker fetches on its own
+    fcntl = None
+
+_export_decoder = msgspec.msgpack.Decoder(RidershipExport)
+
+
+def _digest(value: str) -> str:
+    """Short, filesystem-safe digest of a string"""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:32]
+
+
+class DiskCache:
+    """
+    Parsed dumps stored as msgpack files, keyed by bucket, key and ETag.
+
+    Each bucket has a small JSON pointer to its most recent dump, so a new
+    process can load the last parsed dump without touching S3 and only needs
+    to revalidate it. Only the latest dump per bucket is kept.
+
+    The directory is also the shared tier between workers of one host: a lock
+    file per dump lets a single worker download it while the others wait and
+    then read its copy, and encoded response bodies are stored as files that
+    every worker maps read-only, so the page cache holds one copy of them.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _entry_prefix(self, bucket: str, key: str, etag: str) -> str:
+        return f"{_digest(bucket)}-{_digest(f'{key}/{etag}')}"
+
+    def _dump_path(self, bucket: str, key: str, etag: str) -> Path:
+        return self.directory / f"{self._entry_prefix(bucket, key, etag)}.msgpack"
+
+    def _body_path(self, bucket: str, key: str, etag: str, coding: str) -> Path:
+        return self.directory / f"{self._entry_prefix(bucket, key, etag)}.body.{coding}"
+
+    def _lock_path(self, bucket: str, key: str, etag: str) -> Path:
+        return self.directory / f"{self._entry_prefix(bucket, key, etag)}.lock"
+
+    def _pointer_path(self, bucket: str) -> Path:
+        return self.directory / f"{_digest(bucket)}.latest.json"
+
+    @contextmanager
+    def _pointer_lock(self, bucket: str) -> Iterator[None]:
+        """Hold the cross-process lock serializing updates of a bucket's pointer"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.directory / f"{_digest(bucket)}.latest.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _remove_entry(self, bucket: str, key: str, etag: str) -> None:
+        """
+        Delete the stored dump and bodies of an entry
+
+        Its lock file is kept: another worker may still be waiting on it.
+        Lock files are pruned by later stores instead (see _prune_locks()).
+        Workers still serving mapped bodies keep them readable until they
+        unmap them.
+        """
+        for path in self.directory.glob(f"{self._entry_prefix(bucket, key, etag)}.*"):
+            if path.suffix != '.lock':
+                path.unlink(missing_ok=True)
+
+    def _prune_locks(self, bucket: str, keep: Iterable[Path]) -> None:
+        """
+        Delete the lock files of a bucket's dumps that no worker holds
+
+        A worker that opened one just before it is deleted notices when it
+        takes the lock (see try_lock()) and locks a new file instead.
+
+        Args:
+            bucket: S3 bucket of the dumps
+            keep: Lock files to leave in place
+        """
+        if fcntl is None:
+            return
+        keep = set(keep)
+        for path in self.directory.glob(f"{_digest(bucket)}-*.lock"):
+            if path in keep:
+                continue
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                path.unlink(missing_ok=True)
+            except BlockingIOError:
+                pass
+            finally:
+                os.close(fd)
+
+    def _write_atomic(self, path: Path, content: bytes) -> None:
+        """Write a file so readers only ever see the old or the complete new content"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load_latest(self, bucket: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the most recent dump stored for a bucket
+
+        Args:
+            bucket: S3 bucket the dump was fetched from
+
+        Returns:
+            Dictionary with the key, etag, last_modified, checked_at and parsed
+            data of the dump, or None if nothing usable is stored
+
+        Raises:
+            OSError, ValueError: If the stored files are unreadable or corrupt
+        """
+        pointer_path = self._pointer_path(bucket)
+        if not pointer_path.exists():
+            return None
+
+        pointer = json.loads(pointer_path.read_bytes())
+        try:
+            stored = {
+                'key': str(pointer['key']),
+                'etag': str(pointer['etag']),
+                'last_modified': datetime.fromisoformat(pointer['last_modified']),
+                'checked_at': float(pointer['checked_at'])
+            }
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed pointer {pointer_path.name}: {e!r}") from e
+
+        stored['data'] = self.load(bucket, stored['key'], stored['etag'])
+        if stored['data'] is None:
+            return None
+        return stored
+
+    def load(self, bucket: str, key: str, etag: str) -> Optional[RidershipExport]:
+        """
+        Load a specific dump, e.g. one another worker just downloaded
+
+        Args:
+            bucket: S3 bucket the dump was fetched from
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+
+        Returns:
+            The parsed dump, or None if it is not stored
+
+        Raises:
+            OSError, ValueError: If the stored file is unreadable or corrupt
+        """
+        try:
+            content = self._dump_path(bucket, key, etag).read_bytes()
+        except FileNotFoundError:
+            return None
+        return _export_decoder.decode(content)
+
+    def try_lock(self, bucket: str, key: str, etag: str) -> Optional[int]:
+        """
+        Try to take the cross-process lock guarding the download of a dump
+
+        The lock is released by release() or when the process exits.
+
+        Args:
+            bucket: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+
+        Returns:
+            A handle to pass to release(), -1 if locking is not supported on
+            this platform, or None if another process holds the lock
+        """
+        if fcntl is None:
+            return -1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._lock_path(bucket, key, etag)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                current = os.stat(path).st_ino == os.fstat(fd).st_ino
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            except FileNotFoundError:
+                current = False
+            except BaseException:
+                os.close(fd)
+                raise
+            if current:
+                return fd
+            # The file was pruned between opening and locking it
+            os.close(fd)
+
+    def release(self, handle: int) -> None:
+        """Release a lock taken with try_lock()"""
+        if handle < 0:
+            return
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        os.close(handle)
+
+    def load_body(self, bucket: str, key: str, etag: str, codings: Iterable[str]) -> Optional[Dict[str, memoryview]]:
+        """
+        Map the stored encoded response bodies of a dump into memory
+
+        The maps are read-only and backed by the files, so every worker
+        serving the same dump shares their pages instead of holding a copy.
+
+        Args:
+            bucket: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            codings: Content codings that must all be present
+
+        Returns:
+            Mapping of content coding to a read-only view of its bytes, or None
+            if any of the codings is not stored
+
+        Raises:
+            OSError, ValueError: If a stored file cannot be mapped
+        """
+        variants: Dict[str, memoryview] = {}
+        for coding in codings:
+            try:
+                with open(self._body_path(bucket, key, etag, coding), 'rb') as f:
+                    # The map stays valid after the file is closed, or even unlinked
+                    variants[coding] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except FileNotFoundError:
+                return None
+        return variants
+
+    def store_body(self, bucket: str, key: str, etag: str, variants: Dict[str, Any]) -> None:
+        """
+        Persist the encoded response bodies of a dump for other workers to map
+
+        Args:
+            bucket: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            variants: Bytes-like body per content coding
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for coding, content in variants.items():
+            self._write_atomic(self._body_path(bucket, key, etag, coding), content)
+
+    def store(self, bucket: str, key: str, etag: str, last_modified: datetime,
+              checked_at: float, data: RidershipExport) -> None:
+        """
+        Persist a parsed dump as the latest one of its bucket
+
+        The files of the dump it replaces are deleted, and so are the lock
+        files of older dumps that no worker holds. A dump older than the
+        one already stored (e.g. from a worker that finished late) is not
+        kept, and its encoded bodies are deleted instead.
+
+        Args:
+            bucket: S3 bucket the dump was fetched from
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            last_modified: When the dump was written to S3
+            checked_at: When the dump was last confirmed to be current
+            data: The parsed dump
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._pointer_lock(bucket):
+            try:
+                previous = json.loads(self._pointer_path(bucket).read_bytes())
+                previous_version = (datetime.fromisoformat(previous['last_modified']), previous['key'])
+            except FileNotFoundError:
+                previous = None
+            except (OSError, ValueError, KeyError, TypeError):
+                # An unreadable pointer is replaced; the files it pointed to are left behind
+                previous = None
+            same_dump = previous is not None and (previous['key'], previous['etag']) == (key, etag)
+            if previous is not None and not same_dump and (last_modified, key) < previous_version:
+                self._remove_entry(bucket, key, etag)
+                return
+
+            self._write_atomic(self._dump_path(bucket, key, etag), msgspec.msgpack.encode(data))
+            self._write_atomic(self._pointer_path(bucket), json.dumps({
+                'key': key,
+                'etag': etag,
+                'last_modified': last_modified.isoformat(),
+                'checked_at': checked_at
+            }).encode('utf-8'))
+            if previous is not None and not same_dump:
+                self._remove_entry(bucket, previous['key'], previous['etag'])
+                # Locks of the new and the replaced dump may still be waited on
+                self._prune_locks(bucket, [
+                    self._lock_path(bucket, key, etag),
+                    self._lock_path(bucket, previous['key'], previous['etag'])
+                ])
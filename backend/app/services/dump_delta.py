@@ -0,0 +1,188 @@
+"""
+Differences between consecutive ridership modeling dumps
+"""
+from typing import Dict, Any, Optional, List, Tuple
+from app.models.ridership import RidershipExport, RidershipJob, UniqueProject
+from app.services.columnar_store import ColumnarExport, RecordTable, fingerprint
+
+
+def _diff_table(table: RecordTable, records: List[Any]) -> Optional[Tuple[List[Any], List[Tuple[int, Any]], List[int]]]:
+    """
+    Compare the records of a new dump with the live rows of a table, by id
+
+    Args:
+        table: Table holding the records of the cached dump
+        records: Records of the new dump
+
+    Returns:
+        Tuple of the added records, the (row position, record) pairs of changed
+        records and the row positions of removed records, or None if the new
+        dump repeats an id and cannot be matched record by record
+    """
+    position = table.position
+    fingerprints = table.fingerprints
+    seen = set()
+    added: List[Any] = []
+    changed: List[Tuple[int, Any]] = []
+    for record in records:
+        if record.id in seen:
+            return None
+        seen.add(record.id)
+        old_position = position.get(record.id)
+        if old_position is None:
+            added.append(record)
+        elif fingerprints[old_position] != fingerprint(record):
+            changed.append((old_position, record))
+    removed = [old_position for record_id, old_position in position.items() if record_id not in seen]
+    return added, changed, removed
+
+
+class DumpDelta:
+    """
+    Projects and jobs added, changed and removed between the cached dump and a new one
+    """
+
+    def __init__(self, store: ColumnarExport, data: RidershipExport,
+                 projects: Tuple[List[UniqueProject], List[Tuple[int, UniqueProject]], List[int]],
+                 jobs: Tuple[List[RidershipJob], List[Tuple[int, RidershipJob]], List[int]]):
+        self.store = store
+        self.data = data
+        self.added_projects, self.changed_projects, self.removed_projects = projects
+        self.added_jobs, self.changed_jobs, self.removed_jobs = jobs
+
+    @classmethod
+    def between(cls, store: ColumnarExport, data: RidershipExport) -> Optional['DumpDelta']:
+        """
+        Diff a new dump against the store of the cached one
+
+        Args:
+            store: Store of the cached dump
+            data: The new dump
+
+        Returns:
+            The delta, or None if the dumps cannot be matched record by record
+        """
+        projects = _diff_table(store.projects, data.unique_projects)
+        if projects is None:
+            return None
+        jobs = _diff_table(store.jobs, data.jobs)
+        if jobs is None:
+            return None
+        return cls(store, data, projects, jobs)
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of added, changed and removed records of each kind"""
+        return {
+            'projects': {
+                'added': len(self.added_projects),
+                'changed': len(self.changed_projects),
+                'removed': len(self.removed_projects)
+            },
+            'jobs': {
+                'added': len(self.added_jobs),
+                'changed': len(self.changed_jobs),
+                'removed': len(self.removed_jobs)
+            }
+        }
+
+    def is_worth_applying(self, max_fraction: float) -> bool:
+        """
+        Check whether applying the delta beats rebuilding the store
+
+        Deltas touching more than max_fraction of a table's rows, or leaving
+        more than that fraction of its rows tombstoned, are rebuilt from
+        scratch instead, which also compacts the tables.
+        """
+        for table, added, changed, removed in (
+            (self.store.projects, self.added_projects, self.changed_projects, self.removed_projects),
+            (self.store.jobs, self.added_jobs, self.changed_jobs, self.removed_jobs)
+        ):
+            rows = max(len(table), 1)
+            if len(added) + len(changed) + len(removed) > max_fraction * rows:
+                return False
+            if table.removed + len(removed) > max_fraction * (len(table.ids) + len(added)):
+                return False
+        return True
+
+    def apply(self) -> ColumnarExport:
+        """
+        Build the store of the new dump from a copy of the cached one
+
+        Unchanged rows keep their positions, changed rows are overwritten in
+        place, removed rows are tombstoned and added rows are appended.
+
+        Returns:
+            The store of the new dump
+        """
+        store = self.store.copy()
+        store.exported_at = self.data.exported_at
+        store.total_jobs = self.data.total_jobs
+        store.total_unique_projects = self.data.total_unique_projects
+        for table, added, changed, removed in (
+            (store.projects, self.added_projects, self.changed_projects, self.removed_projects),
+            (store.jobs, self.added_jobs, self.changed_jobs, self.removed_jobs)
+        ):
+            for position in removed:
+                table.remove(position)
+            for position, record in changed:
+                table.replace(position, record)
+            for record in added:
+                table.append(record)
+        return store
+
+    def changelog_entry(self) -> Dict[str, Any]:
+        """
+        Describe the delta for the changelog of its environment
+
+        Returns:
+            Dictionary with the added and changed records, and the ids of the
+            removed records, of each kind
+        """
+        return {
+            'projects': {
+                'added': self.added_projects,
+                'changed': [project for _, project in self.changed_projects],
+                'removed': [self.store.projects.ids[position] for position in self.removed_projects]
+            },
+            'jobs': {
+                'added': self.added_jobs,
+                'changed': [job for _, job in self.changed_jobs],
+                'removed': [self.store.jobs.ids[position] for position in self.removed_jobs]
+            }
+        }
+
+
+def merge_changes(changes: List[Dict[str, Any]]) -> Dict[str, Dict[str, List[Any]]]:
+    """
+    Combine consecutive changelog entries into the net change between their first and last dump
+
+    Args:
+        changes: Changelog entries, oldest first, each leading to the dump of the next one
+
+    Returns:
+        Dictionary with the added and modified records, and the ids of the
+        removed records, of each kind ('projects' and 'jobs')
+    """
+    merged: Dict[str, Dict[str, List[Any]]] = {}
+    for kind in ('projects', 'jobs'):
+        # Net state per record id: ('added' | 'modified', record) or ('removed', None)
+        states: Dict[str, Tuple[str, Any]] = {}
+        for change in changes:
+            for record in change[kind]['added']:
+                previous = states.get(record.id)
+                states[record.id] = ('modified' if previous and previous[0] == 'removed' else 'added', record)
+            for record in change[kind]['changed']:
+                previous = states.get(record.id)
+                states[record.id] = ('added' if previous and previous[0] == 'added' else 'modified', record)
+            for record_id in change[kind]['removed']:
+                previous = states.get(record_id)
+                if previous and previous[0] == 'added':
+                    del states[record_id]
+                else:
+                    states[record_id] = ('removed', None)
+        merged[kind] = {
+            'added': [record for state, record in states.values() if state == 'added'],
+            'modified': [record for state, record in states.values() if state == 'modified'],
+            'removed': [record_id for record_id, (state, _) in states.items() if state == 'removed']
+        }
+    return merged
@@ -0,0 +1,60 @@
+"""
+Fan-out of new-dump notifications to connected clients
+"""
+import asyncio
+from typing import Dict, Any, Iterable, Optional, Set
+from app.core import json_codec
+
+
+def format_event(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    """
+    Encode a Server-Sent Event
+
+    Args:
+        event: Event type
+        data: JSON-serializable payload
+        event_id: Optional id the browser resends as Last-Event-ID when reconnecting
+
+    Returns:
+        The event, ready to be written to a text/event-stream response
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json_codec.dumps(data).decode('utf-8')}")
+    return ("\n".join(lines) + "\n\n").encode('utf-8')
+
+
+class DumpEvents:
+    """
+    Per-environment subscriber queues for new-dump events.
+
+    Events are encoded once when published and the same bytes are queued for
+    every subscriber, so fan-out to many open dashboards costs one S3 check
+    per refresh interval plus a queue put per client.
+    """
+
+    def __init__(self, environments: Iterable[str], queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {environment: set() for environment in environments}
+
+    def subscribe(self, environment: str) -> asyncio.Queue:
+        """Register a client and get the queue its events are delivered to"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[environment].add(queue)
+        return queue
+
+    def unsubscribe(self, environment: str, queue: asyncio.Queue) -> None:
+        self._subscribers[environment].discard(queue)
+
+    def publish(self, environment: str, message: bytes) -> None:
+        """
+        Queue an encoded event for every subscriber of an environment
+
+        Clients too slow to keep up lose their oldest queued event rather than
+        holding up the others; the next event still tells them what is current.
+        """
+        for queue in self._subscribers[environment]:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
@@ -0,0 +1,126 @@
+"""
+Incremental parser for ridership modeling dumps streamed from S3
+"""
+import sys
+from typing import Dict, Any, Callable, Optional
+import msgspec
+from app.models.ridership import RidershipExport, RidershipJob, UniqueProject
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # ijson is optional, callers fall back to read() + json.loads
+    ijson = None
+    ObjectBuilder = None
+
+# Top-level arrays of the dump that are materialized record by record, and their record types
+RECORD_ARRAYS = {'jobs': RidershipJob, 'unique_projects': UniqueProject}
+
+# Record fields whose values repeat across the export and are interned
+INTERNED_FIELDS = frozenset({
+    'type', 'status', 'map_id', 'map_type', 'project_id', 'baseline_project_id',
+    'service_period_id', 'agency_id', 'agency_name', 'author_name'
+})
+
+_CONTAINER_START = ('start_map', 'start_array')
+_CONTAINER_END = ('end_map', 'end_array')
+
+
+def streaming_available() -> bool:
+    """Check whether the incremental parser (ijson) is installed"""
+    return ijson is not None
+
+
+def _compact(record: Any, record_type: type) -> Any:
+    """
+    Shrink a parsed record by interning its repeated string values and
+    validating it into its typed struct
+
+    Args:
+        record: A job or project built from parser events
+        record_type: Struct type to validate the record into
+
+    Returns:
+        The typed record, sharing one copy of each repeated string
+    """
+    if not isinstance(record, dict):
+        return msgspec.convert(record, record_type)
+    for container in (record, record.get('request_payload')):
+        if not isinstance(container, dict):
+            continue
+        for key in INTERNED_FIELDS.intersection(container):
+            value = container[key]
+            if isinstance(value, str):
+                container[key] = sys.intern(value)
+    return msgspec.convert(record, record_type)
+
+
+async def parse_dump_stream(body: Any, chunk_size: int = 65536) -> RidershipExport:
+    """
+    Parse a dump from an async byte stream without buffering the whole body
+
+    Only one chunk of raw bytes is held at a time; jobs and unique projects
+    are built one record at a time and converted to compact typed structs as
+    they complete, so peak memory is the parsed result plus one chunk.
+
+    Args:
+        body: Object with an async read(size) method, e.g. an S3 StreamingBody
+        chunk_size: Number of bytes to read from the stream at a time
+
+    Returns:
+        The parsed and validated dump
+
+    Raises:
+        ValueError: If the stream is not valid JSON or does not match the export schema
+    """
+    result: Dict[str, Any] = {}
+    builder = None
+    depth = 0
+    sink: Optional[Callable[[Any], None]] = None
+
+    try:
+        async for prefix, event, value in ijson.parse_async(body, buf_size=chunk_size, use_float=True):
+            # Feed events to the value currently being built
+            if builder is not None:
+                builder.event(event, value)
+                if event in _CONTAINER_START:
+                    depth += 1
+                elif event in _CONTAINER_END:
+                    depth -= 1
+                    if depth == 0:
+                        sink(builder.value)
+                        builder = None
+                continue
+
+            if prefix == '':
+                if event in ('start_array', 'string', 'number', 'boolean', 'null'):
+                    raise ValueError("Dump is not a JSON object")
+                continue
+
+            if prefix in RECORD_ARRAYS and event == 'start_array':
+                result[prefix] = []
+                continue
+            if prefix in RECORD_ARRAYS and event == 'end_array':
+                continue
+
+            if prefix.endswith('.item') and prefix[:-5] in RECORD_ARRAYS:
+                records = result[prefix[:-5]]
+                record_type = RECORD_ARRAYS[prefix[:-5]]
+                sink = lambda record, records=records, record_type=record_type: records.append(
+                    _compact(record, record_type)
+                )
+            elif '.' not in prefix:
+                sink = lambda item, key=prefix: result.__setitem__(key, item)
+            else:
+                continue
+
+            if event in _CONTAINER_START:
+                builder = ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+            else:
+                sink(value)
+    except ijson.JSONError as e:
+        raise ValueError(str(e)) from e
+
+    return msgspec.convert(result, RidershipExport)
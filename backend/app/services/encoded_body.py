@@ -0,0 +1,119 @@
+"""
+Pre-serialized and pre-compressed response bodies for cached dumps
+"""
+import gzip
+from typing import Any, Dict, Optional, Tuple
+from app.core import json_codec, metrics
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings in order of preference when the client weighs several equally
+_PREFERENCE = ('br', 'gzip', 'identity')
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into content codings and their q-values
+
+    Args:
+        header: Raw header value, e.g. 'gzip, deflate, br;q=0.9'
+
+    Returns:
+        Mapping of lower-cased coding (or '*') to q-value
+    """
+    accepted: Dict[str, float] = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def enabled_codings() -> Tuple[str, ...]:
+    """Get the content codings EncodedBody.encode() produces with the current settings"""
+    codings = ['identity']
+    if settings.RESPONSE_GZIP_LEVEL > 0:
+        codings.append('gzip')
+    if brotli is not None and settings.RESPONSE_BROTLI_QUALITY >= 0:
+        codings.append('br')
+    return tuple(codings)
+
+
+class EncodedBody:
+    """
+    JSON bytes of a response body, encoded once, with gzip and brotli variants.
+
+    Built once per dump ETag so serving a cached dump only copies bytes
+    instead of re-encoding and re-compressing the whole export. Variants are
+    bytes, or memoryviews over files shared between worker processes.
+    """
+
+    def __init__(self, variants: Dict[str, Any]):
+        """
+        Args:
+            variants: Bytes-like body per content coding; must include 'identity'
+        """
+        self.variants = variants
+
+    @classmethod
+    def encode(cls, content: Any) -> 'EncodedBody':
+        """
+        Encode a response body and compress it with every available coding
+
+        Args:
+            content: The JSON-serializable response body
+
+        Returns:
+            The encoded body
+        """
+        with metrics.RESPONSE_ENCODE_SECONDS.time(coding='identity'):
+            identity = json_codec.dumps(content)
+        variants: Dict[str, bytes] = {'identity': identity}
+        codings = enabled_codings()
+        if 'gzip' in codings:
+            with metrics.RESPONSE_ENCODE_SECONDS.time(coding='gzip'):
+                variants['gzip'] = gzip.compress(identity, compresslevel=settings.RESPONSE_GZIP_LEVEL)
+        if 'br' in codings:
+            with metrics.RESPONSE_ENCODE_SECONDS.time(coding='br'):
+                variants['br'] = brotli.compress(identity, quality=settings.RESPONSE_BROTLI_QUALITY)
+        for coding, variant in variants.items():
+            metrics.RESPONSE_BODY_BYTES.observe(len(variant), coding=coding)
+        return cls(variants)
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Tuple[str, Any]:
+        """
+        Pick the best available variant for a request
+
+        Args:
+            accept_encoding: The request's Accept-Encoding header
+
+        Returns:
+            Tuple of the content coding ('br', 'gzip' or 'identity') and its bytes
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get('*')
+        best_quality, best_coding = 0.0, 'identity'
+        for coding in _PREFERENCE:
+            if coding not in self.variants:
+                continue
+            quality = accepted.get(coding, wildcard)
+            if quality is None:
+                # identity stays acceptable as a last resort unless explicitly refused
+                quality = 0.001 if coding == 'identity' else 0.0
+            if quality > best_quality:
+                best_quality, best_coding = quality, coding
+        return best_coding, self.variants[best_coding]
@@ -0,0 +1,300 @@
+"""
+In-memory indexes over the projects and jobs of a ridership modeling dump
+"""
+import bisect
+import copy
+from array import array
+from typing import Dict, Any, Optional, List, Tuple, Iterable
+from app.models.ridership import RidershipJob
+from app.services.columnar_store import CodedColumn, ColumnarExport, JobTable, ProjectTable
+from app.services.dump_delta import DumpDelta
+
+# Sort options exposed by the query endpoint and the project field they sort on
+SORT_FIELDS = {
+    'name': 'name',
+    'agency': 'agency_name',
+    'author': 'author_name',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at'
+}
+DIRECTIONS = ('asc', 'desc')
+
+
+class ProjectIndex:
+    """
+    Pre-sorted views and lookup tables over the projects and jobs of a dump.
+
+    Built once when a dump is loaded so paginated, filtered and sorted queries
+    only touch the rows they return instead of re-sorting the whole export,
+    and job/map lookups cost O(selected projects) instead of O(all jobs).
+    Sorting and filtering run on the integer columns of the store; projects
+    and jobs are only rebuilt for the rows a query returns.
+    """
+
+    def __init__(self, store: ColumnarExport):
+        self.store = store
+        self.projects: ProjectTable = store.projects
+        self.jobs: JobTable = store.jobs
+
+        # Job rows and distinct map ids per project
+        self.jobs_by_project: Dict[str, array] = {}
+        map_ids_by_project: Dict[str, set] = {}
+        for position in self.jobs.live_positions():
+            project_id = self.jobs.project_id(position)
+            if project_id is None:
+                continue
+            rows = self.jobs_by_project.get(project_id)
+            if rows is None:
+                rows = self.jobs_by_project[project_id] = array('l')
+            rows.append(position)
+            map_id = self.jobs.map_id[position]
+            if map_id:
+                map_ids_by_project.setdefault(project_id, set()).add(map_id)
+        self.map_ids_by_project: Dict[str, Tuple[str, ...]] = {
+            project_id: tuple(sorted(map_ids)) for project_id, map_ids in map_ids_by_project.items()
+        }
+
+        # Row positions per agency and author, used to narrow filtered queries
+        self.by_agency = self._positions_by_id(self.projects, self.projects.agency)
+        self.by_author = self._positions_by_id(self.projects, self.projects.author)
+
+        self._build_orders()
+
+    def _build_orders(self) -> None:
+        """Sort the live projects for every sort option"""
+        self.created_at = self.projects.created_at.micros
+        self.updated_at = self.projects.updated_at.micros
+
+        # For every sort option: row positions in sorted order, and each row's rank in it
+        live_positions = self.projects.live_positions()
+        self._orders: Dict[Tuple[str, str], array] = {}
+        self._ranks: Dict[Tuple[str, str], array] = {}
+        for sort_by in SORT_FIELDS:
+            keys = self._sort_keys(sort_by)
+            for direction in DIRECTIONS:
+                order = array('l', sorted(live_positions, key=keys.__getitem__, reverse=direction == 'desc'))
+                ranks = array('l', bytes(order.itemsize * len(keys)))
+                for rank, position in enumerate(order):
+                    ranks[position] = rank
+                self._orders[(sort_by, direction)] = order
+                self._ranks[(sort_by, direction)] = ranks
+
+    @staticmethod
+    def _positions_by_id(projects: ProjectTable, column: CodedColumn) -> Dict[str, List[int]]:
+        """Group the live rows of an (id, name) coded column by id"""
+        positions_by_code: List[List[int]] = [[] for _ in column.dictionary]
+        codes = column.codes
+        for position in projects.live_positions():
+            positions_by_code[codes[position]].append(position)
+        positions: Dict[str, List[int]] = {}
+        for (value_id, _), code_positions in zip(column.dictionary, positions_by_code):
+            if code_positions:
+                positions.setdefault(str(value_id), []).extend(code_positions)
+        for value_positions in positions.values():
+            value_positions.sort()
+        return positions
+
+    def apply(self, delta: DumpDelta, store: ColumnarExport) -> 'ProjectIndex':
+        """
+        Build the index of the next dump from this one and the delta between them
+
+        Only the job lists, map ids and agency/author lookups of the projects
+        the delta touches are rebuilt; the rest is shared with this index,
+        which stays valid for readers still using the previous dump.
+
+        Args:
+            delta: Delta from this index's dump to the next one
+            store: Store of the next dump, i.e. delta.apply()
+
+        Returns:
+            The index of the next dump
+        """
+        index = copy.copy(self)
+        index.store = store
+        index.projects = store.projects
+        index.jobs = store.jobs
+
+        # Jobs: rebuild the rows and map ids of every project a job left or joined
+        touched_jobs = set(delta.removed_jobs)
+        touched_jobs.update(position for position, _ in delta.changed_jobs)
+        affected_projects = {self.jobs.project_id(position) for position in touched_jobs}
+        affected_projects.update(job.project_id for _, job in delta.changed_jobs)
+        affected_projects.update(job.project_id for job in delta.added_jobs)
+        affected_projects.discard(None)
+
+        new_positions: Dict[str, List[int]] = {}
+        for job in [job for _, job in delta.changed_jobs] + delta.added_jobs:
+            if job.project_id is not None:
+                new_positions.setdefault(job.project_id, []).append(store.jobs.position[job.id])
+
+        index.jobs_by_project = dict(self.jobs_by_project)
+        index.map_ids_by_project = dict(self.map_ids_by_project)
+        for project_id in affected_projects:
+            rows = [position for position in self.jobs_by_project.get(project_id, ()) if position not in touched_jobs]
+            rows.extend(new_positions.get(project_id, ()))
+            rows.sort()
+            map_ids = tuple(sorted({store.jobs.map_id[position] for position in rows if store.jobs.map_id[position]}))
+            if rows:
+                index.jobs_by_project[project_id] = array('l', rows)
+            else:
+                index.jobs_by_project.pop(project_id, None)
+            if map_ids:
+                index.map_ids_by_project[project_id] = map_ids
+            else:
+                index.map_ids_by_project.pop(project_id, None)
+
+        # Projects: move touched rows between agency/author lookups, copying the lists they change
+        index.by_agency = dict(self.by_agency)
+        index.by_author = dict(self.by_author)
+        changed_positions = [position for position, _ in delta.changed_projects]
+        added_positions = [store.projects.position[project.id] for project in delta.added_projects]
+        for lookup, old_column, new_column in ((index.by_agency, self.projects.agency, store.projects.agency),
+                                               (index.by_author, self.projects.author, store.projects.author)):
+            copied = set()
+            for positions, column, insert in ((delta.removed_projects, old_column, False),
+                                              (changed_positions, old_column, False),
+                                              (changed_positions, new_column, True),
+                                              (added_positions, new_column, True)):
+                for position in positions:
+                    key = str(column[position][0])
+                    if key not in copied:
+                        lookup[key] = list(lookup.get(key, ()))
+                        copied.add(key)
+                    if insert:
+                        bisect.insort(lookup[key], position)
+                    else:
+                        lookup[key].remove(position)
+                        if not lookup[key]:
+                            del lookup[key]
+                            copied.discard(key)
+
+        # Sort orders and ranks cover every live project, so they are rebuilt
+        index._build_orders()
+        return index
+
+    def has_project(self, project_id: str) -> bool:
+        """Check whether a project appears in the dump's projects or jobs"""
+        return project_id in self.projects.position or project_id in self.jobs_by_project
+
+    def jobs_for_project(self, project_id: str) -> List[RidershipJob]:
+        """Get the jobs run for a project, in the order they were loaded"""
+        return self.jobs.rows(self.jobs_by_project.get(project_id, ()))
+
+    def map_ids_for_projects(self, project_ids: Iterable[str]) -> List[str]:
+        """
+        Get the distinct map ids used by the jobs of a set of projects
+
+        Args:
+            project_ids: Ids of the selected projects
+
+        Returns:
+            Sorted, de-duplicated map ids
+        """
+        map_ids = set()
+        for project_id in set(project_ids):
+            map_ids.update(self.map_ids_by_project.get(project_id, ()))
+        return sorted(map_ids)
+
+    def _sort_keys(self, sort_by: str) -> Any:
+        """Get the per-row values a sort option orders by"""
+        if sort_by == 'created_at':
+            return self.created_at
+        if sort_by == 'updated_at':
+            return self.updated_at
+        if sort_by == 'name':
+            return [str(name or '') for name in self.projects.names]
+
+        # Rank each distinct agency/author name once and sort rows by the rank of their code
+        column = self.projects.agency if sort_by == 'agency' else self.projects.author
+        names = [str(name or '') for _, name in column.dictionary]
+        rank_of = {name: rank for rank, name in enumerate(sorted(set(names)))}
+        code_ranks = [rank_of[name] for name in names]
+        return array('l', (code_ranks[code] for code in column.codes))
+
+    def _candidate_ranks(self, sort_by: str, direction: str, agency_id: Optional[str],
+                         author_id: Optional[str]) -> Iterable[int]:
+        """Get the ranks, in sort order, of rows matching the agency/author filters"""
+        order = self._orders[(sort_by, direction)]
+        if agency_id is None and author_id is None:
+            return range(len(order))
+
+        positions = None
+        for lookup, value in ((self.by_agency, agency_id), (self.by_author, author_id)):
+            if value is None:
+                continue
+            matches = lookup.get(value, ())
+            positions = set(matches) if positions is None else positions.intersection(matches)
+
+        ranks = self._ranks[(sort_by, direction)]
+        return sorted(ranks[position] for position in positions)
+
+    def query(
+        self,
+        sort_by: str = 'updated_at',
+        direction: str = 'desc',
+        start: int = 0,
+        limit: int = 50,
+        agency_id: Optional[str] = None,
+        author_id: Optional[str] = None,
+        created_after: Optional[int] = None,
+        created_before: Optional[int] = None,
+        updated_after: Optional[int] = None,
+        updated_before: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of projects in sorted order
+
+        Args:
+            sort_by: One of SORT_FIELDS
+            direction: 'asc' or 'desc'
+            start: Rank in the sort order to resume from (0 for the first page)
+            limit: Maximum number of projects to return
+            agency_id: Only include projects of this agency
+            author_id: Only include projects by this author
+            created_after: Only include projects created at or after this time, in microseconds since the epoch
+            created_before: Only include projects created at or before this time, in microseconds since the epoch
+            updated_after: Only include projects updated at or after this time, in microseconds since the epoch
+            updated_before: Only include projects updated at or before this time, in microseconds since the epoch
+
+        Returns:
+            Dictionary with the page of projects, the total number of matches and
+            the rank to resume from for the next page (None on the last page)
+        """
+        order = self._orders[(sort_by, direction)]
+        candidates = self._candidate_ranks(sort_by, direction, agency_id, author_id)
+        bounds = [
+            (column, low, high)
+            for column, low, high in ((self.created_at, created_after, created_before),
+                                      (self.updated_at, updated_after, updated_before))
+            if low is not None or high is not None
+        ]
+
+        # Unfiltered queries are a plain slice of the pre-sorted order
+        if not bounds and isinstance(candidates, range):
+            page = order[start:start + limit]
+            next_start = start + limit if start + limit < len(order) else None
+            return {
+                'projects': self.projects.rows(page),
+                'total': len(order),
+                'next': next_start
+            }
+
+        positions = []
+        next_start = None
+        total = 0
+        for rank in candidates:
+            position = order[rank]
+            if bounds and not all(
+                (low is None or column[position] >= low) and (high is None or column[position] <= high)
+                for column, low, high in bounds
+            ):
+                continue
+            total += 1
+            if rank < start:
+                continue
+            if len(positions) < limit:
+                positions.append(position)
+            elif next_start is None:
+                next_start = rank
+
+        return {'projects': self.projects.rows(positions), 'total': total, 'next': next_start}
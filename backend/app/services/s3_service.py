@@ -1,13 +1,29 @@
 """
 S3 service for fetching ridership modeling data
 """
-import json
+import asyncio
 import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple, Deque
 import aiobotocore.session
+from aiobotocore.config import AioConfig
 from botocore.exceptions import ClientError, NoCredentialsError
+from msgspec import UNSET
+from app.core import metrics
+from app.core.metrics import ServerTiming
 from app.core.config import settings
+from app.models.ridership import RidershipExport, decode_export
+from app.services import dump_parser
+from app.services.columnar_store import ColumnarExport, parse_micros
+from app.services.disk_cache import DiskCache
+from app.services.dump_delta import DumpDelta, merge_changes
+from app.services.dump_events import DumpEvents, format_event
+from app.services.encoded_body import EncodedBody, enabled_codings
+from app.services.project_index import ProjectIndex
 
 
 class S3Service:
@@ -18,11 +34,166 @@ class S3Service:
         self.base_bucket_name = settings.S3_BUCKET_NAME
         self.file_prefix = settings.S3_FILE_PREFIX
         self.file_pattern = settings.S3_FILE_PATTERN
+        self.key_pattern = re.compile(rf'{re.escape(self.file_pattern)}(\d{{8}}_\d{{6}})\.json$')
         # Separate cache for each environment
         self.cache = {
-            'local': {'etag': None, 'data': None, 'last_modified': None},
-            'production': {'etag': None, 'data': None, 'last_modified': None}
+            'local': self._empty_cache_entry(),
+            'production': self._empty_cache_entry()
         }
+        # Parsed dumps persisted across restarts
+        self.disk_cache = DiskCache(settings.DISK_CACHE_DIR) if settings.DISK_CACHE_ENABLED else None
+        # Long-lived S3 clients (one per environment), opened by start()
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._clients: Dict[str, Any] = {}
+        self._client_lock: Optional[asyncio.Lock] = None
+        # Background tasks keeping each environment's cache warm
+        self._refresh_tasks: List[asyncio.Task] = []
+        # One-off fetch of every environment's latest dump at startup
+        self._prefetch_task: Optional[asyncio.Task] = None
+        # One-off stale-while-revalidate checks, at most one per environment
+        self._revalidations: Dict[str, asyncio.Task] = {}
+        # Dump downloads in progress, keyed by (environment, ETag)
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Threads decoding and indexing dumps off the event loop, started on first use,
+        # and per-environment locks serializing the swap of a new dump into the cache
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._build_locks: Dict[str, asyncio.Lock] = {}
+        # Recent dump-to-dump deltas per environment, oldest first
+        self.changelog: Dict[str, Deque[Dict[str, Any]]] = {
+            environment: deque(maxlen=settings.DELTA_HISTORY_SIZE) for environment in self.cache
+        }
+        # Clients notified when a new dump is loaded
+        self.events = DumpEvents(self.cache, settings.EVENTS_QUEUE_SIZE)
+    
+    async def start(self) -> None:
+        """
+        Open a pooled S3 client for every environment and load any dumps
+        persisted by a previous process.
+        
+        Called from the FastAPI lifespan hook so connections, credentials and
+        TLS sessions are reused across requests instead of per S3 call.
+        Environments are set up concurrently.
+        """
+        await asyncio.gather(*(self._start_environment(environment) for environment in self.cache))
+    
+    async def _start_environment(self, environment: str) -> None:
+        """Open the S3 client of an environment and seed its cache from disk"""
+        await self.get_client(environment)
+        await self._load_from_disk(environment)
+    
+    def start_prefetch(self) -> None:
+        """
+        Fetch the latest dump of every environment concurrently in the background
+        
+        Saves the first request to each environment a cold fetch when the
+        background refresher is disabled; when it runs, its first pass already
+        does the same.
+        """
+        if not settings.S3_PREFETCH_ON_STARTUP or self._refresh_tasks or self._prefetch_task is not None:
+            return
+        self._prefetch_task = asyncio.create_task(self._prefetch())
+    
+    async def _prefetch(self) -> None:
+        """Revalidate every environment at once"""
+        await asyncio.gather(*(self._refresh_once(environment) for environment in self.cache))
+    
+    async def _load_from_disk(self, environment: str) -> None:
+        """
+        Seed an environment's cache from the disk cache, to be revalidated against S3
+        
+        Args:
+            environment: Environment to load ('local' or 'production')
+        """
+        if self.disk_cache is None or self.cache[environment]['store'] is not None:
+            return
+        
+        bucket_name = self.get_bucket_name(environment)
+        loop = asyncio.get_running_loop()
+        try:
+            stored = await loop.run_in_executor(None, self.disk_cache.load_latest, bucket_name)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable disk cache for {bucket_name}: {e}")
+            return
+        if stored is None:
+            return
+        
+        print(f"Loaded {stored['key']} from the disk cache ({environment} environment)")
+        started = time.perf_counter()
+        self.cache[environment] = await self._run_in_worker(
+            self._build_entry, bucket_name, stored['key'], stored['etag'],
+            stored['last_modified'], stored['checked_at'], stored['data']
+        )
+        metrics.DUMP_BUILD_SECONDS.observe(time.perf_counter() - started, environment=environment, mode='full')
+        self._observe_entry(environment, self.cache[environment])
+    
+    async def close(self) -> None:
+        """Close all pooled S3 clients and their connections, and stop the worker threads"""
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+        self._exit_stack = None
+        self._clients = {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = None
+    
+    async def _run_in_worker(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run CPU-bound dump work (decoding, diffing, indexing) on the worker threads
+        
+        Requests keep being served while a large dump is ingested, instead of
+        stalling behind it. With DUMP_WORKER_THREADS set to 0 the work runs
+        on the event loop.
+        
+        Args:
+            func: Function to run
+            *args: Arguments to call it with
+            
+        Returns:
+            What the function returned
+        """
+        if settings.DUMP_WORKER_THREADS <= 0:
+            return func(*args)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(settings.DUMP_WORKER_THREADS, thread_name_prefix='dump-worker')
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    async def get_client(self, environment: str = 'local'):
+        """
+        Get the long-lived S3 client for an environment, creating it on first use
+        
+        Args:
+            environment: Environment the client is used for ('local' or 'production')
+            
+        Returns:
+            An open aiobotocore S3 client
+        """
+        client = self._clients.get(environment)
+        if client is not None:
+            return client
+        
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        
+        async with self._client_lock:
+            client = self._clients.get(environment)
+            if client is None:
+                if self._exit_stack is None:
+                    self._exit_stack = AsyncExitStack()
+                config = AioConfig(
+                    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    connector_args={'keepalive_timeout': settings.S3_KEEPALIVE_TIMEOUT}
+                )
+                client = await self._exit_stack.enter_async_context(
+                    self.session.create_client(
+                        's3',
+                        region_name=settings.AWS_REGION,
+                        endpoint_url=settings.S3_ENDPOINT_URL or None,
+                        config=config
+                    )
+                )
+                self._clients[environment] = client
+            return client
     
     def get_bucket_name(self, environment: str) -> str:
         """
@@ -38,178 +209,677 @@ class S3Service:
             return f"{self.base_bucket_name}production"
         return f"{self.base_bucket_name}staging" 
     
-    async def get_latest_file_key(self, environment: str = 'local') -> Optional[str]:
+    async def get_latest_file_key(self, environment: str = 'local', last_known_key: Optional[str] = None) -> Optional[str]:
         """
-        Find the most recent ridership modeling file in the S3 bucket
+        Find the key of the most recent ridership modeling file in the S3 bucket
         
         Args:
             environment: Environment to fetch from ('local' or 'production')
+            last_known_key: Key of the most recent dump seen so far, if any
         
         Returns:
             The S3 key of the most recent file, or None if no files found
         """
+        latest = await self.get_latest_file(environment, last_known_key)
+        return latest['key'] if latest else None
+    
+    async def get_latest_file(self, environment: str = 'local', last_known_key: Optional[str] = None,
+                              timing: Optional[ServerTiming] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the most recent ridership modeling file in the S3 bucket, with its listed metadata
+        
+        Dump names embed a YYYYMMDD_HHMMSS timestamp and sort lexically, so the
+        listing is streamed page by page keeping only the newest match. When the
+        last known dump key is given, listing starts just before it and skips
+        the older history; if that key is gone the full prefix is scanned.
+        
+        Args:
+            environment: Environment to fetch from ('local' or 'production')
+            last_known_key: Key of the most recent dump seen so far, if any
+            timing: Timings of the request being served, if any
+        
+        Returns:
+            Dictionary with the key, and the ETag, LastModified and size when
+            the listing includes them, or None if no files found
+        """
         bucket_name = self.get_bucket_name(environment)
         
         try:
-            async with self.session.create_client('s3', region_name=settings.AWS_REGION) as s3_client:
-                # List objects with the given prefix
-                response = await s3_client.list_objects_v2(
-                    Bucket=bucket_name,
-                    Prefix=self.file_prefix
-                )
-                
-                if 'Contents' not in response:
-                    return None
-                
-                # Filter files that match our pattern and extract timestamps
-                matching_files = []
-                pattern = re.compile(rf'{re.escape(self.file_pattern)}(\d{{8}}_\d{{6}})\.json$')
-                
-                for obj in response['Contents']:
-                    key = obj['Key']
-                    match = pattern.search(key)
-                    if match:
-                        timestamp_str = match.group(1)
-                        try:
-                            # Parse timestamp format: YYYYMMDD_HHMMSS
-                            timestamp = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                            matching_files.append({
-                                'key': key,
-                                'timestamp': timestamp,
-                                'last_modified': obj['LastModified']
-                            })
-                        except ValueError:
-                            # Skip files with invalid timestamp format
-                            continue
-                
-                if not matching_files:
-                    return None
-                
-                # Sort by timestamp (most recent first)
-                matching_files.sort(key=lambda x: x['timestamp'], reverse=True)
-                return matching_files[0]['key']
+            s3_client = await self.get_client(environment)
+            paginator = s3_client.get_paginator('list_objects_v2')
+            
+            params = {'Bucket': bucket_name, 'Prefix': self.file_prefix}
+            if last_known_key:
+                # Start just before the known key so it is listed as well
+                params['StartAfter'] = last_known_key[:-1]
+            
+            latest = None
+            latest_timestamp = ''
+            started = time.perf_counter()
+            async for page in paginator.paginate(**params):
+                elapsed = time.perf_counter() - started
+                metrics.S3_REQUEST_SECONDS.observe(elapsed, operation='list', environment=environment)
+                if timing is not None:
+                    timing.add('s3-list', elapsed)
+                for obj in page.get('Contents', ()):
+                    match = self.key_pattern.search(obj['Key'])
+                    if not match:
+                        continue
+                    timestamp_str = match.group(1)
+                    if timestamp_str > latest_timestamp and self._is_valid_timestamp(timestamp_str):
+                        latest_timestamp = timestamp_str
+                        latest = obj
+                started = time.perf_counter()
+            
+            if latest is None:
+                if last_known_key:
+                    return await self.get_latest_file(environment, timing=timing)
+                return None
+            return {
+                'key': latest['Key'],
+                'etag': latest['ETag'].strip('"') if latest.get('ETag') else None,
+                'last_modified': latest.get('LastModified'),
+                'size': latest.get('Size')
+            }
                 
         except (ClientError, NoCredentialsError) as e:
+            metrics.S3_REQUEST_ERRORS.inc(operation='list', environment=environment)
             print(f"Error listing S3 objects in {bucket_name}: {e}")
             return None
     
-    async def get_file_metadata(self, key: str, environment: str = 'local') -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _is_valid_timestamp(timestamp_str: str) -> bool:
+        """Check that a YYYYMMDD_HHMMSS string is a real date and time"""
+        try:
+            datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
+            return True
+        except ValueError:
+            return False
+    
+    async def get_file_metadata(self, key: str, environment: str = 'local',
+                                timing: Optional[ServerTiming] = None) -> Optional[Dict[str, Any]]:
         """
         Get metadata for a specific S3 file
         
         Args:
             key: The S3 object key
             environment: Environment to fetch from ('local' or 'production')
+            timing: Timings of the request being served, if any
             
         Returns:
-            Dictionary with ETag and LastModified, or None if error
+            Dictionary with ETag, LastModified and size, or None if error
         """
         bucket_name = self.get_bucket_name(environment)
         
         try:
-            async with self.session.create_client('s3', region_name=settings.AWS_REGION) as s3_client:
+            s3_client = await self.get_client(environment)
+            with metrics.S3_REQUEST_SECONDS.time(operation='head', environment=environment), metrics.phase(timing, 's3-head'):
                 response = await s3_client.head_object(
                     Bucket=bucket_name,
                     Key=key
                 )
-                return {
-                    'etag': response['ETag'].strip('"'),
-                    'last_modified': response['LastModified']
-                }
+            return {
+                'etag': response['ETag'].strip('"'),
+                'last_modified': response['LastModified'],
+                'size': response.get('ContentLength')
+            }
         except (ClientError, NoCredentialsError) as e:
+            metrics.S3_REQUEST_ERRORS.inc(operation='head', environment=environment)
             print(f"Error getting S3 object metadata from {bucket_name}: {e}")
             return None
     
-    async def fetch_file_content(self, key: str, environment: str = 'local') -> Optional[Dict[str, Any]]:
+    async def fetch_file_content(self, key: str, environment: str = 'local', size: Optional[int] = None,
+                                 etag: Optional[str] = None,
+                                 timing: Optional[ServerTiming] = None) -> Optional[RidershipExport]:
         """
         Fetch the content of an S3 file
         
+        Objects larger than one S3_DOWNLOAD_PART_SIZE part are downloaded as
+        byte ranges over several connections at once, so a large dump is not
+        limited to the throughput of a single connection. Smaller objects, or
+        objects of unknown size, are fetched with a single GET. With
+        S3_STREAMING_PARSE enabled every dump is fetched with a single GET
+        and parsed while it streams in, so its raw bytes are never held in
+        full alongside the parsed dump.
+        
         Args:
             key: The S3 object key
             environment: Environment to fetch from ('local' or 'production')
+            size: Size of the object in bytes, if known
+            etag: ETag of the object, if known; ranged downloads fail rather
+                than mix parts of two versions if the object is replaced
+            timing: Timings of the request being served, if any
             
         Returns:
-            Parsed JSON content or None if error
+            Parsed and validated export or None if error
         """
         bucket_name = self.get_bucket_name(environment)
         
         try:
-            async with self.session.create_client('s3', region_name=settings.AWS_REGION) as s3_client:
+            s3_client = await self.get_client(environment)
+            streaming = settings.S3_STREAMING_PARSE and dump_parser.streaming_available()
+            if (not streaming and size is not None and size > settings.S3_DOWNLOAD_PART_SIZE
+                    and settings.S3_DOWNLOAD_CONCURRENCY > 1):
+                with metrics.phase(timing, 's3-get', 'ranged'):
+                    content = await self._download_ranges(s3_client, environment, bucket_name, key, size, etag)
+            else:
+                started = time.perf_counter()
                 response = await s3_client.get_object(
                     Bucket=bucket_name,
                     Key=key
                 )
                 
-                # Read the file content
-                content = await response['Body'].read()
-                
-                # Parse JSON
-                data = json.loads(content.decode('utf-8'))
-                
-                return data
-                
+                async with response['Body'] as body:
+                    if streaming:
+                        # Parse record by record while the body streams in
+                        data = await dump_parser.parse_dump_stream(body, settings.S3_STREAM_CHUNK_SIZE)
+                        elapsed = time.perf_counter() - started
+                        metrics.S3_REQUEST_SECONDS.observe(elapsed, operation='get', environment=environment)
+                        metrics.DUMP_DECODE_SECONDS.observe(elapsed, environment=environment, mode='streaming')
+                        if timing is not None:
+                            timing.add('s3-get', elapsed, 'streaming parse')
+                        self._observe_download(environment, response.get('ContentLength'))
+                        return data
+                    
+                    # Read the file content
+                    content = await body.read()
+                elapsed = time.perf_counter() - started
+                metrics.S3_REQUEST_SECONDS.observe(elapsed, operation='get', environment=environment)
+                if timing is not None:
+                    timing.add('s3-get', elapsed)
+            
+            # Parse and validate JSON
+            self._observe_download(environment, len(content))
+            with metrics.DUMP_DECODE_SECONDS.time(environment=environment, mode='buffered'), metrics.phase(timing, 'decode'):
+                return await self._run_in_worker(decode_export, content)
+            
         except (ClientError, NoCredentialsError) as e:
+            metrics.S3_REQUEST_ERRORS.inc(operation='get', environment=environment)
             print(f"Error fetching S3 file content from {bucket_name}: {e}")
             return None
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             print(f"Error parsing JSON content: {e}")
             return None
     
-    async def get_latest_data(self, environment: str = 'local') -> Dict[str, Any]:
+    @staticmethod
+    def _observe_download(environment: str, size: Optional[int]) -> None:
+        """Record the size of a downloaded dump"""
+        if size is None:
+            return
+        metrics.S3_BYTES_DOWNLOADED.inc(size, environment=environment)
+        metrics.DUMP_SIZE_BYTES.observe(size, environment=environment)
+    
+    async def _download_ranges(self, s3_client: Any, environment: str, bucket_name: str, key: str, size: int,
+                               etag: Optional[str] = None) -> bytearray:
         """
-        Get the latest ridership modeling data with ETag-based caching
+        Download an object as parallel byte-range GETs into a pre-sized buffer
         
         Args:
-            environment: Environment to fetch from ('local' or 'production')
+            s3_client: Client to download with
+            environment: Environment the object belongs to ('local' or 'production')
+            bucket_name: S3 bucket of the object
+            key: S3 key of the object
+            size: Size of the object in bytes
+            etag: ETag every part must match, if known
+            
+        Returns:
+            The object's bytes
+            
+        Raises:
+            ValueError: If a part comes back shorter or longer than requested
+        """
+        part_size = settings.S3_DOWNLOAD_PART_SIZE
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        semaphore = asyncio.Semaphore(settings.S3_DOWNLOAD_CONCURRENCY)
+        
+        async def download_part(start: int) -> None:
+            end = min(start + part_size, size)
+            params = {'Bucket': bucket_name, 'Key': key, 'Range': f"bytes={start}-{end - 1}"}
+            if etag:
+                params['IfMatch'] = etag
+            async with semaphore:
+                started = time.perf_counter()
+                response = await s3_client.get_object(**params)
+                offset = start
+                async with response['Body'] as body:
+                    while offset < end:
+                        chunk = await body.read(min(settings.S3_STREAM_CHUNK_SIZE, end - offset))
+                        if not chunk:
+                            break
+                        view[offset:offset + len(chunk)] = chunk
+                        offset += len(chunk)
+                    if offset != end or await body.read(1):
+                        raise ValueError(f"Byte range {start}-{end - 1} of {key} has an unexpected length")
+                metrics.S3_REQUEST_SECONDS.observe(time.perf_counter() - started, operation='get_range', environment=environment)
         
+        tasks = [asyncio.create_task(download_part(start)) for start in range(0, size, part_size)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            view.release()
+        return buffer
+    
+    def _empty_cache_entry(self) -> Dict[str, Any]:
+        """Build an empty cache entry for an environment"""
+        return {
+            'etag': None, 'store': None, 'index': None, 'body': None,
+            'last_modified': None, 'key': None, 'checked_at': None
+        }
+    
+    def _static_response(self, key: str, data: RidershipExport, last_modified: datetime) -> Dict[str, Any]:
+        """
+        Build the part of the API response that only depends on the dump itself
+        
+        Args:
+            key: S3 key of the dump
+            data: The parsed dump
+            last_modified: When the dump was written to S3
+            
         Returns:
             Dictionary with success status and data
         """
+        return {
+            "success": True,
+            "data": {
+                "projects": data,
+                "lastModified": last_modified.isoformat(),
+                "totalCount": len(data) if isinstance(data, list) else 0,
+                "sourceFile": key
+            }
+        }
+    
+    @staticmethod
+    def age_seconds(env_cache: Dict[str, Any]) -> float:
+        """Seconds since a cache entry was last confirmed to match S3"""
+        return max(time.time() - env_cache['checked_at'], 0.0)
+    
+    @staticmethod
+    def freshness_seconds() -> float:
+        """How long a cache entry counts as fresh after it was confirmed to match S3"""
+        if settings.S3_REFRESH_INTERVAL_SECONDS > 0:
+            return settings.S3_REFRESH_INTERVAL_SECONDS
+        return settings.S3_FRESHNESS_SECONDS
+    
+    async def refresh(self, environment: str = 'local', timing: Optional[ServerTiming] = None) -> Dict[str, Any]:
+        """
+        Revalidate the cached dump for an environment against S3
+        
+        Lists the dumps prefix, compares the ETag of the newest file with the
+        cached one and only downloads the file when it changed. The ETag and
+        LastModified come from the listing; the file is only HEADed when the
+        listing lacks them. New data is swapped in as a whole new cache entry
+        so readers never see a partially updated one.
+        
+        Args:
+            environment: Environment to refresh ('local' or 'production')
+            timing: Timings of the request being served, if any
+            
+        Returns:
+            Dictionary with success status and whether the cached dump was replaced
+        """
+        bucket_name = self.get_bucket_name(environment)
+        
+        # Find the latest file
+        last_known_key = self.cache[environment]['key'] if settings.S3_LIST_FROM_LAST_KEY else None
+        latest = await self.get_latest_file(environment, last_known_key, timing)
+        if not latest:
+            return {
+                "success": False,
+                "error": f"No ridership modeling files found in S3 bucket: {bucket_name}"
+            }
+        latest_key = latest['key']
+        
+        # Get file metadata, unless the listing already had it
+        if latest['etag'] and latest['last_modified'] is not None:
+            metadata = {'etag': latest['etag'], 'last_modified': latest['last_modified'], 'size': latest['size']}
+        else:
+            metadata = await self.get_file_metadata(latest_key, environment, timing)
+        if not metadata:
+            return {
+                "success": False,
+                "error": "Could not fetch file metadata"
+            }
+        
+        current_etag = metadata['etag']
+        
+        # Only one coroutine downloads and parses a given dump, the others wait for
+        # it. If that one is cancelled (e.g. its request was aborted) the first
+        # waiter to wake up takes over the download.
+        flight_key = (environment, current_etag)
+        while True:
+            # Nothing changed, just record that the cached dump is still current
+            env_cache = self.cache[environment]
+            if env_cache['etag'] == current_etag and env_cache['store'] is not None:
+                env_cache['checked_at'] = time.time()
+                return {"success": True, "updated": False}
+            
+            pending = self._inflight.get(flight_key)
+            if pending is None:
+                break
+            metrics.COALESCED_REQUESTS.inc(environment=environment)
+            try:
+                with metrics.phase(timing, 'wait', 'coalesced'):
+                    return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    # This waiter itself was cancelled
+                    raise
+        
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = pending
         try:
-            bucket_name = self.get_bucket_name(environment)
+            result = await self._load_dump(environment, latest_key, metadata, timing)
+            pending.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[flight_key]
+    
+    def _encode_body(self, bucket_name: str, key: str, etag: str, content: Dict[str, Any]) -> EncodedBody:
+        """
+        Encode the response body of a dump, sharing it with other workers through the disk cache
+        
+        The first worker to build the body of a dump writes its variants to the
+        disk cache; every worker then serves read-only maps of those files, so
+        the page cache holds a single copy instead of one per worker.
+        
+        Args:
+            bucket_name: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            content: The response body
             
-            # Find the latest file
-            latest_key = await self.get_latest_file_key(environment)
-            if not latest_key:
-                return {
-                    "success": False,
-                    "error": f"No ridership modeling files found in S3 bucket: {bucket_name}"
-                }
+        Returns:
+            The encoded body, backed by shared files when possible
+        """
+        if self.disk_cache is None or not settings.DISK_CACHE_SHARE_BODIES:
+            return EncodedBody.encode(content)
+        
+        encoded = None
+        try:
+            variants = self.disk_cache.load_body(bucket_name, key, etag, enabled_codings())
+            if variants is None:
+                encoded = EncodedBody.encode(content)
+                self.disk_cache.store_body(bucket_name, key, etag, encoded.variants)
+                variants = self.disk_cache.load_body(bucket_name, key, etag, enabled_codings())
+            if variants is not None:
+                return EncodedBody(variants)
+        except (OSError, ValueError) as e:
+            print(f"Error sharing the encoded body of {key} through the disk cache: {e}")
+        return encoded if encoded is not None else EncodedBody.encode(content)
+    
+    def _build_entry(self, bucket_name: str, key: str, etag: str, last_modified: datetime,
+                     checked_at: float, data: RidershipExport, previous: Optional[Dict[str, Any]] = None,
+                     delta: Optional[DumpDelta] = None) -> Dict[str, Any]:
+        """
+        Build a complete cache entry, with its indexes and encoded body, for a parsed dump
+        
+        The entry keeps the dump as a columnar store; the parsed structs are
+        only used to encode the body and can be freed afterwards. Given the
+        previous entry and the delta from its dump, the store and indexes are
+        derived from the previous ones instead of being rebuilt.
+        
+        Args:
+            bucket_name: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            last_modified: When the dump was written to S3
+            checked_at: When the dump was last confirmed to be current
+            data: The parsed dump
+            previous: Cache entry of the dump the delta was computed against
+            delta: Delta from the previous dump to this one
             
-            # Get file metadata
-            metadata = await self.get_file_metadata(latest_key, environment)
-            if not metadata:
-                return {
-                    "success": False,
-                    "error": "Could not fetch file metadata"
-                }
+        Returns:
+            The cache entry
+        """
+        if previous is not None and delta is not None:
+            store = delta.apply()
+            index = previous['index'].apply(delta, store)
+        else:
+            store = ColumnarExport(data)
+            index = ProjectIndex(store)
+        return {
+            'etag': etag,
+            'store': store,
+            'index': index,
+            'body': self._encode_body(bucket_name, key, etag, self._static_response(key, data, last_modified)),
+            'last_modified': last_modified,
+            'key': key,
+            'checked_at': checked_at
+        }
+    
+    def _build_next_entry(self, environment: str, bucket_name: str, key: str, etag: str,
+                          last_modified: datetime, checked_at: float, data: RidershipExport,
+                          previous: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[DumpDelta], str]:
+        """
+        Build the cache entry of a new dump, applying its delta from the previous one when worthwhile
+        
+        Args:
+            environment: Environment the dump belongs to ('local' or 'production')
+            bucket_name: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            last_modified: When the dump was written to S3
+            checked_at: When the dump was confirmed to be current
+            data: The parsed dump
+            previous: The environment's current cache entry
             
-            current_etag = metadata['etag']
-            current_last_modified = metadata['last_modified']
+        Returns:
+            Tuple of the new entry, the delta from the previous dump (None if it
+            could not be computed) and the build mode ('delta' or 'full')
+        """
+        delta = self._diff(previous, data)
+        if delta is not None and delta.is_worth_applying(settings.DELTA_MAX_CHANGED_FRACTION):
+            print(f"Applying delta from {previous['key']} to {key} ({environment} environment): {delta.counts()}")
+            entry = self._build_entry(bucket_name, key, etag, last_modified, checked_at, data, previous, delta)
+            return entry, delta, 'delta'
+        entry = self._build_entry(bucket_name, key, etag, last_modified, checked_at, data)
+        return entry, delta, 'full'
+    
+    def _diff(self, previous: Dict[str, Any], data: RidershipExport) -> Optional[DumpDelta]:
+        """
+        Diff a new dump against the cached one
+        
+        Args:
+            previous: The environment's current cache entry
+            data: The new dump
             
-            # Get cache for this environment
-            env_cache = self.cache[environment]
+        Returns:
+            The delta, or None if delta ingestion is disabled, nothing is
+            cached yet or the dumps cannot be matched record by record
+        """
+        if not settings.DELTA_INGESTION_ENABLED or previous['store'] is None:
+            return None
+        return DumpDelta.between(previous['store'], data)
+    
+    def _record_changes(self, environment: str, previous: Dict[str, Any], entry: Dict[str, Any],
+                        delta: DumpDelta) -> None:
+        """Append the delta between two cache entries to the environment's changelog"""
+        change = {
+            'etag': entry['etag'],
+            'previousEtag': previous['etag'],
+            'key': entry['key'],
+            'previousExportedAt': previous['store'].exported_at,
+            'exportedAt': entry['store'].exported_at,
+            'lastModified': entry['last_modified'],
+            'counts': delta.counts()
+        }
+        change.update(delta.changelog_entry())
+        self.changelog[environment].append(change)
+    
+    def dump_event(self, environment: str, include_delta: bool = False) -> Optional[bytes]:
+        """
+        Encode a 'dump' Server-Sent Event describing the cached dump of an environment
+        
+        Args:
+            environment: Environment to describe ('local' or 'production')
+            include_delta: Attach the counts of changes from the previous dump
+                and, when there are few enough of them, the changed records
             
-            # Check if we have cached data and ETags match
-            if (env_cache['etag'] == current_etag and 
-                env_cache['data'] is not None and 
-                env_cache['last_modified'] is not None):
-                
-                print(f"Using cached data for {latest_key} ({environment} environment)")
-                return {
-                    "success": True,
-                    "data": {
-                        "projects": env_cache['data'],
-                        "lastModified": env_cache['last_modified'].isoformat(),
-                        "totalCount": len(env_cache['data']) if isinstance(env_cache['data'], list) else 0,
-                        "sourceFile": latest_key,
-                        "fromCache": True
-                    }
-                }
+        Returns:
+            The encoded event, or None if nothing is cached yet
+        """
+        env_cache = self.cache[environment]
+        store = env_cache['store']
+        if store is None:
+            return None
+        
+        payload = {
+            'environment': environment,
+            'key': env_cache['key'],
+            'etag': env_cache['etag'],
+            'exportedAt': None if store.exported_at is UNSET else store.exported_at,
+            'lastModified': env_cache['last_modified'].isoformat(),
+            'projectCount': len(store.projects),
+            'jobCount': len(store.jobs)
+        }
+        changes = self.changelog[environment]
+        if include_delta and changes and changes[-1]['etag'] == env_cache['etag']:
+            change = changes[-1]
+            payload['changes'] = change['counts']
+            records = sum(count for kind in change['counts'].values() for count in kind.values())
+            if records <= settings.EVENTS_MAX_DELTA_RECORDS:
+                payload['delta'] = merge_changes([change])
+        return format_event('dump', payload, env_cache['etag'])
+    
+    def get_changes(self, environment: str, since: str) -> Optional[Dict[str, Any]]:
+        """
+        Collect the changes from an earlier dump to the cached one from the changelog
+        
+        Args:
+            environment: Environment to look up ('local' or 'production')
+            since: ETag of the earlier dump (quoted or weak forms are accepted),
+                or an ISO 8601 time to get the changes exported after it
             
-            # Fetch fresh data
-            print(f"Fetching fresh data from {latest_key} ({environment} environment, bucket: {bucket_name})")
-            file_content = await self.fetch_file_content(latest_key, environment)
+        Returns:
+            The added, modified and removed projects and jobs, or None if the
+            retained history does not reach back to since
+        """
+        env_cache = self.cache[environment]
+        changes = list(self.changelog[environment])
+        if changes and changes[-1]['etag'] != env_cache['etag']:
+            changes = []
+        
+        etag = since.strip()
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        etag = etag.strip('"')
+        
+        start = None
+        if etag == env_cache['etag']:
+            start = len(changes)
+        else:
+            start = next((i for i, change in enumerate(changes) if change['previousEtag'] == etag), None)
+        
+        if start is None:
+            since_micros = parse_micros(since)
+            if since_micros is None:
+                return None
+            current_micros = parse_micros(env_cache['store'].exported_at)
+            if current_micros is not None and since_micros >= current_micros:
+                start = len(changes)
+            else:
+                # The first change whose previous dump was exported at or before since
+                for i, change in enumerate(changes):
+                    previous_micros = parse_micros(change['previousExportedAt'])
+                    exported_micros = parse_micros(change['exportedAt'])
+                    if previous_micros is None or exported_micros is None:
+                        continue
+                    if previous_micros <= since_micros < exported_micros:
+                        start = i
+                        break
+            if start is None:
+                return None
+        
+        return merge_changes(changes[start:])
+    
+    async def _lock_dump(self, bucket_name: str, key: str, etag: str) -> Optional[int]:
+        """
+        Wait for the cross-process lock guarding the download of a dump
+        
+        Args:
+            bucket_name: S3 bucket of the dump
+            key: S3 key of the dump
+            etag: S3 ETag of the dump
+            
+        Returns:
+            A handle for DiskCache.release(), or None if the lock could not be
+            taken and the dump should be fetched without it
+        """
+        deadline = time.monotonic() + settings.DISK_CACHE_LOCK_TIMEOUT_SECONDS
+        while True:
+            try:
+                handle = self.disk_cache.try_lock(bucket_name, key, etag)
+            except OSError as e:
+                print(f"Error locking {key} in the disk cache: {e}")
+                return None
+            if handle is not None:
+                return handle
+            if time.monotonic() >= deadline:
+                print(f"Timed out waiting for another worker to fetch {key}")
+                return None
+            await asyncio.sleep(0.1)
+    
+    async def _load_shared(self, bucket_name: str, key: str, etag: str) -> Optional[RidershipExport]:
+        """Load a dump another worker already stored in the disk cache"""
+        if self.disk_cache is None:
+            return None
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.disk_cache.load, bucket_name, key, etag
+            )
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable disk cache entry for {key}: {e}")
+            return None
+    
+    async def _load_dump(self, environment: str, key: str, metadata: Dict[str, Any],
+                         timing: Optional[ServerTiming] = None) -> Dict[str, Any]:
+        """
+        Download and parse a dump and swap it into the cache
+        
+        With the disk cache enabled, workers on the same host coordinate through
+        a lock file so only one of them downloads a given dump; the others wait
+        for it and load its parsed copy from disk.
+        
+        Args:
+            environment: Environment the dump belongs to ('local' or 'production')
+            key: S3 key of the dump
+            metadata: ETag, LastModified and size of the dump
+            timing: Timings of the request being served, if any
+            
+        Returns:
+            Dictionary with success status and whether the cached dump was replaced
+        """
+        bucket_name = self.get_bucket_name(environment)
+        etag = metadata['etag']
+        lock = None
+        if self.disk_cache is not None:
+            with metrics.phase(timing, 'wait', 'disk lock'):
+                lock = await self._lock_dump(bucket_name, key, etag)
+        try:
+            file_content = None
+            if self.disk_cache is not None:
+                with metrics.phase(timing, 'disk'):
+                    file_content = await self._load_shared(bucket_name, key, etag)
+            fetched = file_content is None
+            if fetched:
+                print(f"Fetching fresh data from {key} ({environment} environment, bucket: {bucket_name})")
+                file_content = await self.fetch_file_content(key, environment, metadata.get('size'), etag, timing)
+            else:
+                print(f"Loaded {key} from the shared disk cache ({environment} environment)")
             
             if file_content is None:
                 return {
@@ -217,28 +887,160 @@ class S3Service:
                     "error": "Could not fetch file content"
                 }
             
-            # Update cache for this environment
-            env_cache['etag'] = current_etag
-            env_cache['data'] = file_content
-            env_cache['last_modified'] = current_last_modified
+            # The entry is built off the event loop; the lock keeps another dump
+            # from being swapped in between reading the previous entry and replacing it
+            async with self._build_locks.setdefault(environment, asyncio.Lock()):
+                previous = self.cache[environment]
+                if (previous['store'] is not None and previous['etag'] != etag
+                        and (previous['last_modified'], previous['key']) > (metadata['last_modified'], key)):
+                    # A newer dump finished loading while this one was downloaded
+                    print(f"Not replacing {previous['key']} with the older {key} ({environment} environment)")
+                    return {"success": True, "updated": False}
+                checked_at = time.time()
+                started = time.perf_counter()
+                entry, delta, mode = await self._run_in_worker(
+                    self._build_next_entry, environment, bucket_name, key, etag,
+                    metadata['last_modified'], checked_at, file_content, previous
+                )
+                elapsed = time.perf_counter() - started
+                metrics.DUMP_BUILD_SECONDS.observe(elapsed, environment=environment, mode=mode)
+                if timing is not None:
+                    timing.add('build', elapsed, mode)
+                self.cache[environment] = entry
+                self._observe_entry(environment, entry)
+                if delta is not None:
+                    self._record_changes(environment, previous, entry, delta)
+                else:
+                    # The history no longer leads up to the cached dump
+                    self.changelog[environment].clear()
+                self.events.publish(environment, self.dump_event(environment, include_delta=True))
             
-            return {
-                "success": True,
-                "data": {
-                    "projects": file_content,
-                    "lastModified": current_last_modified.isoformat(),
-                    "totalCount": len(file_content) if isinstance(file_content, list) else 0,
-                    "sourceFile": latest_key,
-                    "fromCache": False
-                }
-            }
+            if fetched and self.disk_cache is not None:
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.disk_cache.store, bucket_name, key, etag,
+                        metadata['last_modified'], checked_at, file_content
+                    )
+                except (OSError, ValueError) as e:
+                    print(f"Error writing {key} to the disk cache: {e}")
+        finally:
+            if lock is not None:
+                self.disk_cache.release(lock)
+        
+        return {"success": True, "updated": True}
+    
+    @staticmethod
+    def _observe_entry(environment: str, entry: Dict[str, Any]) -> None:
+        """Record the size and age of a cache entry swapped into an environment"""
+        metrics.DUMP_RECORDS.set(len(entry['store'].projects), environment=environment, kind='projects')
+        metrics.DUMP_RECORDS.set(len(entry['store'].jobs), environment=environment, kind='jobs')
+        metrics.DUMP_LAST_MODIFIED.set(entry['last_modified'].timestamp(), environment=environment)
+    
+    async def get_cache_entry(self, environment: str = 'local', timing: Optional[ServerTiming] = None) -> Dict[str, Any]:
+        """
+        Get the cache entry holding the latest dump of an environment
+        
+        When the background refresher is running the cached dump is served
+        straight from memory. In stale-while-revalidate mode a cached dump up to
+        S3_MAX_STALENESS_SECONDS old is served immediately while S3 is checked
+        in the background, and is also served if revalidating it fails.
+        Otherwise the dump is revalidated against S3 first.
+        
+        Args:
+            environment: Environment to fetch from ('local' or 'production')
+            timing: Timings of the request being served, if any
             
+        Returns:
+            Dictionary with success status, the cache entry, whether it was
+            served without fetching the dump from S3 and whether it is stale
+        """
+        env_cache = self.cache[environment]
+        has_data = env_cache['store'] is not None
+        age = self.age_seconds(env_cache) if has_data else None
+        stale = age is not None and age > self.freshness_seconds()
+        swr = settings.S3_STALE_WHILE_REVALIDATE
+        within_max_staleness = age is not None and age <= settings.S3_MAX_STALENESS_SECONDS
+        
+        if has_data and self._refresh_tasks and (not swr or within_max_staleness):
+            metrics.CACHE_REQUESTS.inc(environment=environment, result='stale' if stale else 'hit')
+            return {"success": True, "entry": env_cache, "fromCache": True, "stale": stale}
+        
+        if swr and within_max_staleness:
+            if stale:
+                self._revalidate_in_background(environment)
+            metrics.CACHE_REQUESTS.inc(environment=environment, result='stale' if stale else 'hit')
+            return {"success": True, "entry": env_cache, "fromCache": True, "stale": stale}
+        
+        try:
+            result = await self.refresh(environment, timing)
         except Exception as e:
-            print(f"Unexpected error in get_latest_data ({environment}): {e}")
-            return {
-                "success": False,
-                "error": f"Unexpected error: {str(e)}"
-            }
+            result = {"success": False, "error": f"Unexpected error: {str(e)}"}
+        
+        if not result["success"]:
+            metrics.CACHE_REQUESTS.inc(environment=environment, result='error')
+            if swr and has_data:
+                # Past the staleness limit, but still better than failing the request
+                print(f"Serving stale data for {environment} after failed revalidation: {result['error']}")
+                return {"success": True, "entry": env_cache, "fromCache": True, "stale": True}
+            return result
+        
+        env_cache = self.cache[environment]
+        metrics.CACHE_REQUESTS.inc(environment=environment, result='miss' if result["updated"] else 'hit')
+        if not result["updated"]:
+            print(f"Using cached data for {env_cache['key']} ({environment} environment)")
+        return {"success": True, "entry": env_cache, "fromCache": not result["updated"], "stale": False}
+    
+    def _revalidate_in_background(self, environment: str) -> None:
+        """Start a background revalidation of an environment unless one is already running"""
+        task = self._revalidations.get(environment)
+        if task is None or task.done():
+            self._revalidations[environment] = asyncio.create_task(self._refresh_once(environment))
+    
+    async def _refresh_once(self, environment: str) -> None:
+        """
+        Revalidate an environment in the background, logging instead of raising errors
+        
+        Args:
+            environment: Environment to revalidate ('local' or 'production')
+        """
+        try:
+            result = await self.refresh(environment)
+            if not result["success"]:
+                print(f"Background refresh failed ({environment}): {result['error']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Unexpected error in background refresh ({environment}): {e}")
+    
+    async def _refresh_loop(self, environment: str) -> None:
+        """
+        Keep the cached dump of an environment warm by polling S3
+        
+        Args:
+            environment: Environment to poll ('local' or 'production')
+        """
+        while True:
+            await self._refresh_once(environment)
+            await asyncio.sleep(settings.S3_REFRESH_INTERVAL_SECONDS)
+    
+    def start_refresher(self) -> None:
+        """Start one background refresh task per environment"""
+        if self._refresh_tasks or settings.S3_REFRESH_INTERVAL_SECONDS <= 0:
+            return
+        self._refresh_tasks = [
+            asyncio.create_task(self._refresh_loop(environment))
+            for environment in self.cache
+        ]
+    
+    async def stop_refresher(self) -> None:
+        """Cancel the background refresh, prefetch and revalidation tasks and wait for them to finish"""
+        tasks = self._refresh_tasks + list(self._revalidations.values())
+        if self._prefetch_task is not None:
+            tasks.append(self._prefetch_task)
+        self._refresh_tasks, self._revalidations, self._prefetch_task = [], {}, None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 # Global instance
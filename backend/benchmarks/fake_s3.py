@@ -0,0 +1,202 @@
+"""
+In-process stand-in for the parts of the S3 API used by S3Service
+
+Serves ListObjectsV2, HeadObject and GetObject (with Range and If-Match)
+for path-style requests from an aiohttp server, optionally throttling each
+response to a fixed bandwidth so per-connection throughput limits show up
+in benchmarks the way they do against real S3.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Any, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+class FakeS3:
+    """
+    Buckets of in-memory objects behind a local HTTP endpoint
+
+    Point an S3 client at endpoint_url (with any credentials) once start() returns.
+    """
+
+    def __init__(self, bandwidth: Optional[float] = None, latency: float = 0.0, page_size: int = 1000,
+                 chunk_size: int = 65536):
+        """
+        Args:
+            bandwidth: Bytes per second each response body is limited to, None for unlimited
+            latency: Seconds added before every response
+            page_size: Maximum number of keys per ListObjectsV2 page
+            chunk_size: Bytes written to the socket at a time
+        """
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.buckets: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Number of requests served per operation
+        self.requests: Dict[str, int] = {'list': 0, 'head': 0, 'get': 0}
+        self.endpoint_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def put_object(self, bucket: str, key: str, body: bytes) -> str:
+        """
+        Store an object, creating its bucket if needed
+
+        Returns:
+            The object's ETag, without quotes
+        """
+        etag = hashlib.md5(body).hexdigest()
+        self.buckets.setdefault(bucket, {})[key] = {
+            'body': body,
+            'etag': etag,
+            'last_modified': datetime.now(timezone.utc).replace(microsecond=0)
+        }
+        return etag
+
+    def delete_object(self, bucket: str, key: str) -> None:
+        self.buckets.get(bucket, {}).pop(key, None)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Start serving
+
+        Returns:
+            The endpoint URL
+        """
+        app = web.Application()
+        app.router.add_route('GET', '/{bucket}', self._list_objects)
+        app.router.add_route('HEAD', '/{bucket}/{key:.+}', self._head_object)
+        app.router.add_route('GET', '/{bucket}/{key:.+}', self._get_object)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.endpoint_url = f"http://{host}:{bound_port}"
+        return self.endpoint_url
+
+    def environ(self) -> Dict[str, str]:
+        """Environment variables pointing S3Service (and boto clients) created afterwards at this endpoint"""
+        return {
+            'S3_ENDPOINT_URL': self.endpoint_url,
+            'AWS_ENDPOINT_URL': self.endpoint_url,
+            'AWS_ACCESS_KEY_ID': 'benchmark',
+            'AWS_SECRET_ACCESS_KEY': 'benchmark'
+        }
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+        self._runner = None
+
+    @staticmethod
+    def _error(status: int, code: str, message: str) -> web.Response:
+        body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>'
+        return web.Response(status=status, body=body.encode('utf-8'), content_type='application/xml')
+
+    def _lookup(self, request: web.Request) -> Tuple[Optional[Dict[str, Any]], Optional[web.Response]]:
+        """Find the object a request refers to, or the error response to send instead"""
+        bucket = self.buckets.get(request.match_info['bucket'])
+        if bucket is None:
+            return None, self._error(404, 'NoSuchBucket', 'The specified bucket does not exist')
+        obj = bucket.get(request.match_info['key'])
+        if obj is None:
+            return None, self._error(404, 'NoSuchKey', 'The specified key does not exist.')
+        if_match = request.headers.get('If-Match')
+        if if_match is not None and if_match.strip('"') != obj['etag']:
+            return None, self._error(412, 'PreconditionFailed', 'At least one of the preconditions you specified did not hold')
+        return obj, None
+
+    @staticmethod
+    def _object_headers(obj: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            'ETag': f'"{obj["etag"]}"',
+            'Last-Modified': format_datetime(obj['last_modified'], usegmt=True),
+            'Accept-Ranges': 'bytes'
+        }
+
+    async def _list_objects(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        self.requests['list'] += 1
+        bucket = self.buckets.get(request.match_info['bucket'])
+        if bucket is None:
+            return self._error(404, 'NoSuchBucket', 'The specified bucket does not exist')
+
+        prefix = request.query.get('prefix', '')
+        start_after = request.query.get('continuation-token') or request.query.get('start-after', '')
+        max_keys = min(int(request.query.get('max-keys', self.page_size)), self.page_size)
+        keys = sorted(key for key in bucket if key.startswith(prefix) and key > start_after)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+
+        contents = ''.join(
+            f"<Contents><Key>{escape(key)}</Key>"
+            f"<LastModified>{bucket[key]['last_modified'].strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified>"
+            f"<ETag>&quot;{bucket[key]['etag']}&quot;</ETag><Size>{len(bucket[key]['body'])}</Size>"
+            f"<StorageClass>STANDARD</StorageClass></Contents>"
+            for key in page
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ''
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{_XMLNS}">'
+            f"<Name>{escape(request.match_info['bucket'])}</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{contents}</ListBucketResult>"
+        )
+        return web.Response(body=body.encode('utf-8'), content_type='application/xml')
+
+    async def _head_object(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        self.requests['head'] += 1
+        obj, error = self._lookup(request)
+        if error is not None:
+            return web.Response(status=error.status)
+        headers = self._object_headers(obj)
+        headers['Content-Length'] = str(len(obj['body']))
+        return web.Response(headers=headers)
+
+    async def _get_object(self, request: web.Request) -> web.StreamResponse:
+        await asyncio.sleep(self.latency)
+        self.requests['get'] += 1
+        obj, error = self._lookup(request)
+        if error is not None:
+            return error
+
+        body = obj['body']
+        headers = self._object_headers(obj)
+        start, end = 0, len(body)
+        status = 200
+        byte_range = request.headers.get('Range')
+        if byte_range and byte_range.startswith('bytes='):
+            first, _, last = byte_range[len('bytes='):].partition('-')
+            start = int(first)
+            end = min(int(last) + 1, len(body)) if last else len(body)
+            if start >= len(body) or start >= end:
+                return self._error(416, 'InvalidRange', 'The requested range is not satisfiable')
+            headers['Content-Range'] = f"bytes {start}-{end - 1}/{len(body)}"
+            status = 206
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = end - start
+        response.content_type = 'application/octet-stream'
+        await response.prepare(request)
+
+        view = memoryview(body)
+        started = time.perf_counter()
+        for offset in range(start, end, self.chunk_size):
+            chunk = view[offset:min(offset + self.chunk_size, end)]
+            await response.write(chunk)
+            if self.bandwidth:
+                # Sleep until this response is back under its bandwidth budget
+                sent = offset + len(chunk) - start
+                delay = sent / self.bandwidth - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        await response.write_eof()
+        return response
@@ -0,0 +1,111 @@
+"""
+Decode and encode time per MB of export
+
+Encoding is measured for each installed JSON backend. Decoding is measured
+for the two ways a dump can be loaded: decode_export() and the ijson
+stream parser.
+
+Usage (from the backend directory):
+    python -m benchmarks.json_codec --jobs 1000 10000 100000
+"""
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import time
+from typing import Dict, Any, List, Callable
+
+from app.core import json_codec
+from app.models.ridership import decode_export
+from app.services import dump_parser
+from benchmarks.synthetic import generate_dump
+
+
+class _AsyncBytes:
+    """Minimal async stream over bytes, standing in for an S3 body"""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+def _median_seconds(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall-clock time of fn over repeat runs"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def run(num_jobs: int, repeat: int) -> List[Dict[str, Any]]:
+    """
+    Benchmark every encoder and decoder on a synthetic dump of num_jobs jobs
+
+    Returns:
+        One result row per encoder or decoder
+    """
+    dump = generate_dump(num_jobs)
+    payload = json.dumps(dump).encode('utf-8')
+    megabytes = len(payload) / 1e6
+
+    rows = []
+    for name in json_codec.available_backends():
+        _, dumps = json_codec.get_backend(name)
+        encode = _median_seconds(lambda: dumps(dump), repeat)
+        rows.append({
+            'backend': name,
+            'jobs': num_jobs,
+            'megabytes': round(megabytes, 2),
+            'decode_ms_per_mb': None,
+            'encode_ms_per_mb': round(encode * 1000 / megabytes, 3)
+        })
+
+    decode = _median_seconds(lambda: decode_export(payload), repeat)
+    rows.append({
+        'backend': 'decode_export',
+        'jobs': num_jobs,
+        'megabytes': round(megabytes, 2),
+        'decode_ms_per_mb': round(decode * 1000 / megabytes, 3),
+        'encode_ms_per_mb': None
+    })
+
+    if dump_parser.streaming_available():
+        decode = _median_seconds(
+            lambda: asyncio.run(dump_parser.parse_dump_stream(_AsyncBytes(payload))), repeat
+        )
+        rows.append({
+            'backend': 'ijson-stream',
+            'jobs': num_jobs,
+            'megabytes': round(megabytes, 2),
+            'decode_ms_per_mb': round(decode * 1000 / megabytes, 3),
+            'encode_ms_per_mb': None
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1000, 10000], help="Dump sizes in jobs")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement (median is reported)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    rows = [row for num_jobs in args.jobs for row in run(num_jobs, args.repeat)]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'backend':<14}{'jobs':>10}{'MB':>10}{'decode ms/MB':>15}{'encode ms/MB':>15}")
+    for row in rows:
+        decode = '-' if row['decode_ms_per_mb'] is None else f"{row['decode_ms_per_mb']:.3f}"
+        encode = '-' if row['encode_ms_per_mb'] is None else f"{row['encode_ms_per_mb']:.3f}"
+        print(f"{row['backend']:<14}{row['jobs']:>10}{row['megabytes']:>10}{decode:>15}{encode:>15}")
+
+
+if __name__ == '__main__':
+    main()
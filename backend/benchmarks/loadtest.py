@@ -0,0 +1,388 @@
+"""
+End-to-end HTTP load test of the FastAPI app against the fake S3
+
+Boots app.main:app under uvicorn in a separate process, pointed at the
+in-process fake S3 holding a synthetic dump. Concurrent clients then hit
+/api/projects and the query endpoints for a fixed duration. Optionally,
+new dumps are published partway through the run.
+
+Reports throughput, latency percentiles and error rates per endpoint, the
+server's event-loop lag, a per-second timeline with the server's RSS, and
+for every published dump how long the server took to start serving it.
+
+Usage (from the backend directory):
+    python -m benchmarks.loadtest --jobs 100000 --concurrency 50 --duration 30 --publish-at 10 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+from benchmarks.fake_s3 import FakeS3
+from benchmarks.stats import peak_rss_mb, percentile, run_metadata, summarize_ms
+from benchmarks.synthetic import dump_key, encode_dump
+
+ENDPOINTS = ('projects', 'query', 'jobs')
+LAG_METRIC = 'project_explorer_event_loop_lag_seconds'
+SORT_FIELDS = ('name', 'agency', 'author', 'created_at', 'updated_at')
+# The dashboard's default environment, served from the staging bucket
+ENVIRONMENT = 'local'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process and its children (e.g. uvicorn workers), in MB; Linux only"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return round(total / 1024, 1)
+
+
+class LoadTest:
+    """One run: the fake S3, the server process and the clients' measurements"""
+
+    def __init__(self, args: argparse.Namespace):
+        from app.services.s3_service import S3Service
+
+        self.args = args
+        self.bucket = S3Service().get_bucket_name(ENVIRONMENT)
+        self.fake = FakeS3(bandwidth=args.bandwidth * 1e6 if args.bandwidth > 0 else None, latency=args.latency)
+        self.server: Optional[subprocess.Popen] = None
+        self.base_url = ''
+        self.cache_dir = tempfile.TemporaryDirectory(prefix='loadtest-cache-')
+        # Encoded dump revisions, generated up front so publishing does not stall the clients
+        self.revisions: List[bytes] = []
+        self.etags: List[str] = []
+        self.project_ids: List[str] = []
+        self.started = 0.0
+        # (seconds since start, endpoint, status or None on error, latency in seconds, X-Cache)
+        self.samples: List[tuple] = []
+        self.errors: Counter = Counter()
+        self.rss: List[Dict[str, Any]] = []
+        self.publishes: List[Dict[str, Any]] = []
+
+    def publish(self, revision: int) -> None:
+        """Upload a revision of the dump, replacing the previous one"""
+        if revision:
+            self.fake.delete_object(self.bucket, dump_key(revision - 1))
+        self.etags.append(self.fake.put_object(self.bucket, dump_key(revision), self.revisions[revision]))
+
+    async def start_server(self) -> None:
+        """Start uvicorn in a subprocess pointed at the fake S3 and wait until it answers"""
+        port = _free_port()
+        self.base_url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ)
+        env.update(self.fake.environ())
+        env.update({
+            'DISK_CACHE_DIR': self.cache_dir.name,
+            'S3_REFRESH_INTERVAL_SECONDS': str(self.args.refresh_interval),
+            'S3_MAX_POOL_CONNECTIONS': str(max(10, self.args.concurrency))
+        })
+        command = [
+            sys.executable, '-m', 'uvicorn', 'app.main:app',
+            '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(self.args.workers), '--log-level', 'warning', '--no-access-log'
+        ]
+        output = None if self.args.server_output else subprocess.DEVNULL
+        self.server = subprocess.Popen(command, env=env, stdout=output, stderr=output)
+
+        deadline = time.monotonic() + 60
+        async with aiohttp.ClientSession() as session:
+            while True:
+                if self.server.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {self.server.returncode}")
+                try:
+                    async with session.get(f"{self.base_url}/") as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Server did not start within 60 seconds")
+                await asyncio.sleep(0.2)
+
+    def stop_server(self) -> None:
+        if self.server is not None and self.server.poll() is None:
+            self.server.terminate()
+            try:
+                self.server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+        self.cache_dir.cleanup()
+
+    async def warm_up(self, session: aiohttp.ClientSession) -> Dict[str, Any]:
+        """Load the dump with a first request and collect project ids for the jobs endpoint"""
+        started = time.perf_counter()
+        async with session.get(f"{self.base_url}/api/projects") as response:
+            await response.read()
+            first = {
+                'status': response.status,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+                'server_timing': response.headers.get('Server-Timing')
+            }
+        async with session.get(f"{self.base_url}/api/projects/query", params={'limit': '1000'}) as response:
+            page = await response.json()
+        self.project_ids = [project['id'] for project in page['data']['projects']] or ['missing']
+        return first
+
+    def _request(self, rng: random.Random) -> tuple:
+        """Pick the next request: (endpoint, path, query parameters)"""
+        endpoint = rng.choices(ENDPOINTS, weights=self.args.weights)[0]
+        if endpoint == 'projects':
+            return endpoint, '/api/projects', None
+        if endpoint == 'query':
+            return endpoint, '/api/projects/query', {
+                'limit': '50',
+                'sort_by': rng.choice(SORT_FIELDS),
+                'direction': rng.choice(('asc', 'desc'))
+            }
+        return endpoint, f"/api/projects/{rng.choice(self.project_ids)}/jobs", None
+
+    async def client(self, session: aiohttp.ClientSession, seed: int, deadline: float) -> None:
+        """Send requests back to back until the deadline"""
+        rng = random.Random(seed)
+        etag = None
+        while time.perf_counter() < deadline:
+            endpoint, path, params = self._request(rng)
+            headers = {'Accept-Encoding': 'gzip, br'}
+            if endpoint == 'projects' and self.args.conditional and etag:
+                headers['If-None-Match'] = etag
+            started = time.perf_counter()
+            try:
+                async with session.get(f"{self.base_url}{path}", params=params, headers=headers) as response:
+                    await response.read()
+                    status = response.status
+                    cache = response.headers.get('X-Cache')
+                    if endpoint == 'projects' and status == 200:
+                        etag = response.headers.get('ETag')
+                        self._check_publishes(etag, started)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, cache = None, None
+                self.errors[type(e).__name__] += 1
+            self.samples.append((started - self.started, endpoint, status, time.perf_counter() - started, cache))
+
+    def _check_publishes(self, etag: Optional[str], started: float) -> None:
+        """Record when a published dump is first served"""
+        for publish in self.publishes:
+            if publish['visible_after_s'] is None and etag and publish['etag'] in etag:
+                publish['visible_after_s'] = round(started - self.started - publish['at_s'], 3)
+
+    async def publisher(self) -> None:
+        """Publish the next revision of the dump at each --publish-at time"""
+        for revision, at in enumerate(sorted(self.args.publish_at), start=1):
+            await asyncio.sleep(max(0.0, self.started + at - time.perf_counter()))
+            self.publish(revision)
+            self.publishes.append({
+                'revision': revision,
+                'at_s': round(time.perf_counter() - self.started, 3),
+                'etag': self.etags[revision],
+                'visible_after_s': None
+            })
+
+    async def sample_rss(self, deadline: float) -> None:
+        """Sample the server's resident memory once per interval"""
+        while time.perf_counter() < deadline:
+            self.rss.append({
+                'at_s': round(time.perf_counter() - self.started, 3),
+                'rss_mb': _rss_mb(self.server.pid)
+            })
+            await asyncio.sleep(self.args.sample_interval)
+
+    async def event_loop_lag(self, session: aiohttp.ClientSession) -> Optional[Dict[str, Any]]:
+        """
+        Summarize the server's event-loop lag histogram from /metrics
+
+        With several workers this is the lag of whichever worker answers.
+        Percentiles are the upper bounds of the buckets they fall in.
+        """
+        async with session.get(f"{self.base_url}/metrics") as response:
+            if response.status != 200:
+                return None
+            text = await response.text()
+        buckets, total, count = [], 0.0, 0
+        for line in text.splitlines():
+            if line.startswith(f'{LAG_METRIC}_bucket'):
+                bound = line.split('le="', 1)[1].split('"', 1)[0]
+                buckets.append((float(bound), int(line.rsplit(' ', 1)[1])))
+            elif line.startswith(f'{LAG_METRIC}_sum'):
+                total = float(line.rsplit(' ', 1)[1])
+            elif line.startswith(f'{LAG_METRIC}_count'):
+                count = int(line.rsplit(' ', 1)[1])
+        if not count:
+            return None
+
+        def bucket_ms(q: float) -> float:
+            bound = next(bound for bound, cumulative in buckets if cumulative >= q / 100 * count)
+            return bound * 1000
+
+        return {
+            'samples': count,
+            'mean_ms': round(total / count * 1000, 3),
+            'p99_ms_at_most': bucket_ms(99),
+            'max_ms_at_most': bucket_ms(100)
+        }
+
+    async def run(self) -> Dict[str, Any]:
+        args = self.args
+        for revision in range(len(args.publish_at) + 1):
+            self.revisions.append(encode_dump(args.jobs, revision=revision, changed_fraction=args.changed_fraction))
+        await self.fake.start()
+        self.publish(0)
+        try:
+            await self.start_server()
+            timeout = aiohttp.ClientTimeout(total=args.timeout)
+            connector = aiohttp.TCPConnector(limit=args.concurrency)
+            async with aiohttp.ClientSession(timeout=timeout, connector=connector, auto_decompress=False) as session:
+                first = await self.warm_up(session)
+                self.started = time.perf_counter()
+                deadline = self.started + args.duration
+                await asyncio.gather(
+                    self.publisher(),
+                    self.sample_rss(deadline),
+                    *(self.client(session, seed, deadline) for seed in range(args.concurrency))
+                )
+                lag = await self.event_loop_lag(session)
+        finally:
+            self.stop_server()
+            await self.fake.stop()
+        return self.report(first, lag)
+
+    def report(self, first: Dict[str, Any], lag: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        duration = self.args.duration
+        by_endpoint: Dict[str, List[tuple]] = {'all': self.samples}
+        for sample in self.samples:
+            by_endpoint.setdefault(sample[1], []).append(sample)
+
+        summary = []
+        for endpoint, samples in by_endpoint.items():
+            if not samples:
+                continue
+            failed = sum(1 for sample in samples if sample[2] is None or sample[2] >= 400)
+            row = {
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'requests_per_second': round(len(samples) / duration, 1),
+                'errors': failed,
+                'error_rate': round(failed / len(samples), 4),
+                'cache': dict(Counter(sample[4] for sample in samples if sample[4]))
+            }
+            row.update(summarize_ms([sample[3] for sample in samples]))
+            summary.append(row)
+
+        timeline = []
+        rss = {int(point['at_s']): point['rss_mb'] for point in self.rss}
+        for second in range(int(duration)):
+            samples = [sample for sample in self.samples if second <= sample[0] < second + 1]
+            timeline.append({
+                'second': second,
+                'requests': len(samples),
+                'errors': sum(1 for sample in samples if sample[2] is None or sample[2] >= 400),
+                'p95_ms': round(percentile([sample[3] for sample in samples], 95) * 1000, 3) if samples else None,
+                'rss_mb': rss.get(second)
+            })
+
+        rss_values = [point['rss_mb'] for point in self.rss if point['rss_mb'] is not None]
+        return {
+            'first_request': first,
+            'summary': summary,
+            'client_errors': dict(self.errors),
+            'publishes': self.publishes,
+            'server_rss_mb': {
+                'min': min(rss_values), 'max': max(rss_values), 'last': rss_values[-1]
+            } if rss_values else None,
+            'event_loop_lag': lag,
+            'timeline': timeline,
+            'megabytes': round(len(self.revisions[0]) / 1e6, 2)
+        }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    first = report['first_request']
+    print(f"Dump: {report['megabytes']} MB; first request {first['status']} in {first['latency_ms']:.1f} ms "
+          f"({first['server_timing']})\n")
+    print(f"{'endpoint':<10}{'requests':>10}{'req/s':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  cache")
+    for row in report['summary']:
+        cache = ' '.join(f"{status}={count}" for status, count in sorted(row['cache'].items()))
+        print(f"{row['endpoint']:<10}{row['requests']:>10}{row['requests_per_second']:>10.1f}{row['errors']:>8}"
+              f"{row['median_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}  {cache}")
+    if report['client_errors']:
+        print(f"Client errors: {report['client_errors']}")
+    lag = report['event_loop_lag']
+    if lag is not None:
+        print(f"Server event-loop lag: mean {lag['mean_ms']:.1f} ms, p99 <= {lag['p99_ms_at_most']:g} ms, "
+              f"max <= {lag['max_ms_at_most']:g} ms over {lag['samples']} samples")
+
+    print(f"\n{'second':>6}{'requests':>10}{'errors':>8}{'p95 ms':>10}{'RSS MB':>10}")
+    for point in report['timeline']:
+        p95 = '-' if point['p95_ms'] is None else f"{point['p95_ms']:.1f}"
+        rss = '-' if point['rss_mb'] is None else f"{point['rss_mb']:.1f}"
+        print(f"{point['second']:>6}{point['requests']:>10}{point['errors']:>8}{p95:>10}{rss:>10}")
+
+    for publish in report['publishes']:
+        visible = publish['visible_after_s']
+        print(f"\nRevision {publish['revision']} published at {publish['at_s']:.1f} s, "
+              + (f"served {visible:.2f} s later" if visible is not None else "not served before the end of the run"))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, default=10000, help="Dump size in jobs")
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run for")
+    parser.add_argument('--weights', type=float, nargs=3, default=[1, 4, 2], metavar=('PROJECTS', 'QUERY', 'JOBS'),
+                        help="Relative frequency of /api/projects, /api/projects/query and /api/projects/{id}/jobs")
+    parser.add_argument('--conditional', action='store_true',
+                        help="Revalidate /api/projects with If-None-Match like the dashboard does")
+    parser.add_argument('--publish-at', type=float, nargs='*', default=[],
+                        help="Seconds into the run at which to publish a new dump")
+    parser.add_argument('--changed-fraction', type=float, default=0.01, help="Fraction of jobs changed by each new dump")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument('--refresh-interval', type=float, default=5, help="Server's S3_REFRESH_INTERVAL_SECONDS")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds of latency added to every S3 request")
+    parser.add_argument('--bandwidth', type=float, default=0, help="Per-connection S3 bandwidth in MB/s (0 for unlimited)")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument('--sample-interval', type=float, default=1, help="Seconds between server RSS samples")
+    parser.add_argument('--server-output', action='store_true', help="Show the server's output")
+    parser.add_argument('--output', help="Write the report and run metadata to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(LoadTest(args).run())
+    _print_report(report)
+
+    if args.output:
+        metadata = run_metadata(vars(args))
+        metadata['client_peak_rss_mb'] = peak_rss_mb()
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata, **report}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
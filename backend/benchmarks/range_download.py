@@ -0,0 +1,102 @@
+"""
+Wall-clock time of fetching a dump with a single GET versus parallel byte ranges
+
+Runs against the in-process fake S3 with every response throttled to a
+fixed per-connection bandwidth, the limit ranged downloads work around.
+The streaming parser is disabled so every run decodes the same way and only
+the download strategy differs.
+
+Usage (from the backend directory):
+    python -m benchmarks.range_download --jobs 50000 --bandwidth 20 --concurrency 1 4 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Dict, Any, List
+
+from benchmarks.fake_s3 import FakeS3
+from benchmarks.synthetic import dump_key, encode_dump
+
+
+async def run(num_jobs: int, bandwidth_mb: float, latency: float, concurrency_levels: List[int],
+              part_size_mb: float, repeat: int) -> List[Dict[str, Any]]:
+    """
+    Fetch a synthetic dump of num_jobs jobs at every concurrency level
+
+    Returns:
+        One result row per concurrency level
+    """
+    fake = FakeS3(bandwidth=bandwidth_mb * 1e6 if bandwidth_mb > 0 else None, latency=latency)
+    await fake.start()
+    os.environ.update(fake.environ())
+
+    # Imported once the endpoint is set so the service's clients pick it up
+    from app.core.config import settings
+    from app.services.s3_service import S3Service
+
+    service = S3Service()
+    payload = encode_dump(num_jobs)
+    etag = fake.put_object(service.get_bucket_name('local'), dump_key(), payload)
+
+    settings.S3_STREAMING_PARSE = False
+    settings.S3_DOWNLOAD_PART_SIZE = int(part_size_mb * 1024 * 1024)
+    settings.S3_MAX_POOL_CONNECTIONS = max(settings.S3_MAX_POOL_CONNECTIONS, max(concurrency_levels))
+
+    rows = []
+    try:
+        for concurrency in concurrency_levels:
+            settings.S3_DOWNLOAD_CONCURRENCY = concurrency
+            timings = []
+            for _ in range(repeat):
+                requests_before = fake.requests['get']
+                started = time.perf_counter()
+                data = await service.fetch_file_content(dump_key(), 'local', len(payload), etag)
+                timings.append(time.perf_counter() - started)
+                if data is None or len(data.jobs) != num_jobs:
+                    raise RuntimeError(f"Fetching the dump failed at concurrency {concurrency}")
+                gets = fake.requests['get'] - requests_before
+            seconds = statistics.median(timings)
+            rows.append({
+                'concurrency': concurrency,
+                'gets': gets,
+                'jobs': num_jobs,
+                'megabytes': round(len(payload) / 1e6, 2),
+                'bandwidth_mb_s': bandwidth_mb,
+                'seconds': round(seconds, 3),
+                'throughput_mb_s': round(len(payload) / 1e6 / seconds, 2)
+            })
+    finally:
+        await service.close()
+        await fake.stop()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, default=50000, help="Dump size in jobs")
+    parser.add_argument('--bandwidth', type=float, default=20.0, help="Per-connection bandwidth in MB/s (0 for unlimited)")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds of latency added to every S3 request")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help="Parallel ranges (1 is a single GET)")
+    parser.add_argument('--part-size', type=float, default=8, help="Part size in MiB")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args.jobs, args.bandwidth, args.latency, args.concurrency, args.part_size, args.repeat))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    single = next((row['seconds'] for row in rows if row['concurrency'] == 1), None)
+    print(f"{'concurrency':>12}{'GETs':>6}{'MB':>10}{'seconds':>10}{'MB/s':>10}{'speedup':>10}")
+    for row in rows:
+        speedup = '-' if single is None else f"{single / row['seconds']:.2f}x"
+        print(f"{row['concurrency']:>12}{row['gets']:>6}{row['megabytes']:>10}"
+              f"{row['seconds']:>10.3f}{row['throughput_mb_s']:>10.2f}{speedup:>10}")
+
+
+if __name__ == '__main__':
+    main()
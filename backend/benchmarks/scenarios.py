@@ -0,0 +1,285 @@
+"""
+Cold fetch, warm hit, new-dump swap and concurrent-client scenarios for S3Service
+
+Runs offline against the in-process fake S3 with synthetic dumps. Every
+request is served the way /api/projects serves it: get_cache_entry() with
+a Server-Timing collector, then content negotiation of the encoded body.
+
+Scenarios:
+    cold        first request of a fresh service: LIST, GET, decode, build
+    warm        repeated requests for an unchanged dump, either revalidated
+                against S3 (one LIST each) or served from memory
+    swap        first request after a new dump is published, applying the
+                delta from the cached dump or rebuilding from scratch
+    concurrent  many clients at once, on a cold and on a warm cache
+
+Usage (from the backend directory):
+    python -m benchmarks.scenarios --jobs 1000 10000 100000 --output results.json
+    python -m benchmarks.scenarios --jobs 1000 10000 100000 --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from benchmarks.fake_s3 import FakeS3
+from benchmarks.stats import compare, peak_rss_mb, run_metadata, summarize_ms
+from benchmarks.synthetic import dump_key, encode_dump
+
+SCENARIOS = ('cold', 'warm', 'swap', 'concurrent')
+ENVIRONMENT = 'local'
+ACCEPT_ENCODING = 'gzip, deflate, br'
+
+
+class Bench:
+    """A fake S3 holding revisions of one synthetic dump, and services to run against it"""
+
+    def __init__(self, fake: FakeS3, num_jobs: int, changed_fraction: float):
+        from app.services.s3_service import S3Service
+
+        self.fake = fake
+        self.num_jobs = num_jobs
+        self.changed_fraction = changed_fraction
+        self.service_class = S3Service
+        self.bucket = S3Service().get_bucket_name(ENVIRONMENT)
+        self.revision = -1
+        self.megabytes = 0.0
+
+    def publish(self) -> None:
+        """Upload the next revision of the dump, replacing the previous one"""
+        if self.revision >= 0:
+            self.fake.delete_object(self.bucket, dump_key(self.revision))
+        self.revision += 1
+        payload = encode_dump(self.num_jobs, revision=self.revision, changed_fraction=self.changed_fraction)
+        self.fake.put_object(self.bucket, dump_key(self.revision), payload)
+        self.megabytes = round(len(payload) / 1e6, 2)
+
+    def new_service(self):
+        return self.service_class()
+
+    async def request(self, service) -> Tuple[float, Dict[str, float]]:
+        """
+        Serve one /api/projects request from a service
+
+        Returns:
+            Tuple of the request's duration in seconds and the seconds spent in each phase
+        """
+        from app.core.metrics import ServerTiming
+
+        timing = ServerTiming()
+        result = await service.get_cache_entry(ENVIRONMENT, timing)
+        if not result["success"]:
+            raise RuntimeError(f"Request failed: {result['error']}")
+        result["entry"]['body'].negotiate(ACCEPT_ENCODING)
+        return time.perf_counter() - timing.started, timing.durations()
+
+    def s3_requests(self) -> Dict[str, int]:
+        return dict(self.fake.requests)
+
+
+def _requests_since(before: Dict[str, int], after: Dict[str, int], runs: int) -> Dict[str, float]:
+    """Average number of S3 requests per run, by operation"""
+    return {operation: round((after[operation] - before[operation]) / runs, 2) for operation in after}
+
+
+def _median_phases(phases: List[Dict[str, float]]) -> Dict[str, float]:
+    """Median milliseconds per phase over runs, counting runs that skipped a phase as zero"""
+    names = sorted({name for run in phases for name in run})
+    return {
+        name: summarize_ms([run.get(name, 0.0) for run in phases])['median_ms']
+        for name in names
+    }
+
+
+def _row(bench: Bench, scenario: str, mode: str, durations: List[float], phases: List[Dict[str, float]],
+         s3_requests: Dict[str, float], **extra: Any) -> Dict[str, Any]:
+    row = {
+        'scenario': scenario,
+        'mode': mode,
+        'jobs': bench.num_jobs,
+        'megabytes': bench.megabytes,
+        'runs': len(durations)
+    }
+    row.update(summarize_ms(durations))
+    row['phases_ms'] = _median_phases(phases)
+    row['s3_requests'] = s3_requests
+    row.update(extra)
+    return row
+
+
+async def run_cold(bench: Bench, repeat: int) -> List[Dict[str, Any]]:
+    """First request of a fresh service, repeated with a new service each time"""
+    durations, phases = [], []
+    before = bench.s3_requests()
+    for _ in range(repeat):
+        service = bench.new_service()
+        try:
+            duration, phase = await bench.request(service)
+        finally:
+            await service.close()
+        durations.append(duration)
+        phases.append(phase)
+    return [_row(bench, 'cold', 'fetch', durations, phases, _requests_since(before, bench.s3_requests(), repeat))]
+
+
+async def run_warm(bench: Bench, repeat: int) -> List[Dict[str, Any]]:
+    """Requests for an unchanged, already cached dump"""
+    from app.core.config import settings
+
+    rows = []
+    service = bench.new_service()
+    try:
+        await bench.request(service)
+        for mode, stale_while_revalidate in (('revalidate', False), ('memory', True)):
+            settings.S3_STALE_WHILE_REVALIDATE = stale_while_revalidate
+            durations, phases = [], []
+            before = bench.s3_requests()
+            for _ in range(repeat):
+                duration, phase = await bench.request(service)
+                durations.append(duration)
+                phases.append(phase)
+            rows.append(_row(bench, 'warm', mode, durations, phases, _requests_since(before, bench.s3_requests(), repeat)))
+    finally:
+        settings.S3_STALE_WHILE_REVALIDATE = False
+        await service.close()
+    return rows
+
+
+async def run_swap(bench: Bench, repeat: int) -> List[Dict[str, Any]]:
+    """First request after a new dump is published, with and without delta ingestion"""
+    from app.core.config import settings
+
+    rows = []
+    for mode, delta in (('delta', True), ('full', False)):
+        settings.DELTA_INGESTION_ENABLED = delta
+        service = bench.new_service()
+        try:
+            await bench.request(service)
+            durations, phases = [], []
+            before = bench.s3_requests()
+            for _ in range(repeat):
+                bench.publish()
+                duration, phase = await bench.request(service)
+                durations.append(duration)
+                phases.append(phase)
+            rows.append(_row(bench, 'swap', mode, durations, phases, _requests_since(before, bench.s3_requests(), repeat)))
+        finally:
+            settings.DELTA_INGESTION_ENABLED = True
+            await service.close()
+    return rows
+
+
+async def run_concurrent(bench: Bench, clients: int) -> List[Dict[str, Any]]:
+    """Many clients requesting the dump at once, on a cold and on a warm cache"""
+    rows = []
+    service = bench.new_service()
+    try:
+        for mode in ('cold', 'warm'):
+            before = bench.s3_requests()
+            started = time.perf_counter()
+            results = await asyncio.gather(*(bench.request(service) for _ in range(clients)))
+            wall = time.perf_counter() - started
+            durations = [duration for duration, _ in results]
+            rows.append(_row(
+                bench, 'concurrent', mode, durations, [phase for _, phase in results],
+                _requests_since(before, bench.s3_requests(), 1),
+                clients=clients,
+                wall_ms=round(wall * 1000, 3),
+                requests_per_second=round(clients / wall, 1)
+            ))
+    finally:
+        await service.close()
+    return rows
+
+
+async def run(jobs: List[int], scenarios: List[str], repeat: int, clients: int, changed_fraction: float,
+              latency: float, bandwidth_mb: float) -> List[Dict[str, Any]]:
+    """
+    Run the selected scenarios for every dump size
+
+    Returns:
+        One result row per scenario, mode and dump size
+    """
+    fake = FakeS3(bandwidth=bandwidth_mb * 1e6 if bandwidth_mb > 0 else None, latency=latency)
+    await fake.start()
+    os.environ.update(fake.environ())
+
+    # Imported once the endpoint is set so the services' clients pick it up
+    from app.core.config import settings
+
+    # Every scenario controls its own caching; nothing is shared through disk or background tasks
+    settings.DISK_CACHE_ENABLED = False
+    settings.S3_STALE_WHILE_REVALIDATE = False
+    settings.S3_REFRESH_INTERVAL_SECONDS = 3600
+    settings.S3_MAX_POOL_CONNECTIONS = max(settings.S3_MAX_POOL_CONNECTIONS, clients)
+
+    rows = []
+    try:
+        for num_jobs in jobs:
+            bench = Bench(fake, num_jobs, changed_fraction)
+            bench.publish()
+            if 'cold' in scenarios:
+                rows.extend(await run_cold(bench, repeat))
+            if 'warm' in scenarios:
+                rows.extend(await run_warm(bench, repeat))
+            if 'concurrent' in scenarios:
+                rows.extend(await run_concurrent(bench, clients))
+            if 'swap' in scenarios:
+                rows.extend(await run_swap(bench, repeat))
+            fake.buckets.clear()
+    finally:
+        await fake.stop()
+    return rows
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<12}{'mode':<12}{'jobs':>9}{'MB':>9}{'median ms':>12}{'p95 ms':>12}  S3 requests/run   phases (median ms)")
+    for row in rows:
+        requests = ' '.join(f"{operation}={count:g}" for operation, count in row['s3_requests'].items() if count)
+        phases = ' '.join(f"{name}={ms:g}" for name, ms in row['phases_ms'].items())
+        print(f"{row['scenario']:<12}{row['mode']:<12}{row['jobs']:>9}{row['megabytes']:>9}"
+              f"{row['median_ms']:>12.3f}{row['p95_ms']:>12.3f}  {requests or '-':<17}{phases}")
+
+
+def _print_comparison(rows: List[Dict[str, Any]]) -> None:
+    print(f"\n{'scenario':<12}{'mode':<12}{'jobs':>9}{'baseline ms':>14}{'current ms':>14}{'ratio':>8}")
+    for row in rows:
+        print(f"{row['scenario']:<12}{row['mode']:<12}{row['jobs']:>9}"
+              f"{row['baseline']:>14.3f}{row['current']:>14.3f}{row['ratio']:>8.3f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Dump sizes in jobs (up to 1000000)")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help="Scenarios to run")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement")
+    parser.add_argument('--clients', type=int, default=50, help="Clients in the concurrent scenario")
+    parser.add_argument('--changed-fraction', type=float, default=0.01, help="Fraction of jobs changed by each new dump")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds of latency added to every S3 request")
+    parser.add_argument('--bandwidth', type=float, default=0, help="Per-connection bandwidth in MB/s (0 for unlimited)")
+    parser.add_argument('--output', help="Write the results and run metadata to this JSON file")
+    parser.add_argument('--baseline', help="Compare median latencies with the results in this JSON file")
+    args = parser.parse_args(argv)
+
+    rows = asyncio.run(run(args.jobs, args.scenarios, args.repeat, args.clients, args.changed_fraction,
+                           args.latency, args.bandwidth))
+    _print_rows(rows)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        _print_comparison(compare(rows, baseline, ('scenario', 'mode', 'jobs')))
+
+    if args.output:
+        metadata = run_metadata(vars(args))
+        metadata['peak_rss_mb'] = peak_rss_mb()
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata, 'results': rows}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
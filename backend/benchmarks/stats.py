@@ -0,0 +1,74 @@
+"""
+Summary statistics and run metadata shared by the benchmarks
+"""
+import math
+import platform
+import resource
+import sys
+import time
+from typing import Dict, Any, List, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q between 0 and 100) of a non-empty sequence"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_ms(seconds: Sequence[float]) -> Dict[str, float]:
+    """Median, p95, p99, min and max of durations in seconds, in milliseconds"""
+    return {
+        'median_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p95_ms': round(percentile(seconds, 95) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'min_ms': round(min(seconds) * 1000, 3),
+        'max_ms': round(max(seconds) * 1000, 3)
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return round(peak / 1e6 if sys.platform == 'darwin' else peak / 1e3, 1)
+
+
+def run_metadata(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe the environment a benchmark ran in, stored next to its results"""
+    from app.core import json_codec
+    from app.core.config import settings
+    from app.services import dump_parser
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'json_codec': json_codec.BACKEND,
+        'streaming_parse': settings.S3_STREAMING_PARSE and dump_parser.streaming_available(),
+        'arguments': arguments
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], keys: Sequence[str],
+            metric: str = 'median_ms') -> List[Dict[str, Any]]:
+    """
+    Match result rows with baseline rows on keys and compute the change of a metric
+
+    Returns:
+        One row per matched result with the baseline value, the new value and
+        their ratio (below 1 is faster)
+    """
+    previous = {tuple(row.get(key) for key in keys): row for row in baseline}
+    rows = []
+    for row in results:
+        match = previous.get(tuple(row.get(key) for key in keys))
+        if match is None or not match.get(metric) or row.get(metric) is None:
+            continue
+        rows.append({
+            **{key: row.get(key) for key in keys},
+            'baseline': match[metric],
+            'current': row[metric],
+            'ratio': round(row[metric] / match[metric], 3)
+        })
+    return rows
@@ -0,0 +1,203 @@
+"""
+Synthetic ridership modeling dumps for benchmarks
+"""
+import argparse
+import json
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List
+
+MAP_TYPES = ('ridership', 'od_matrix', 'catchment')
+STATUSES = ('completed', 'completed', 'completed', 'failed')
+
+DUMP_PREFIX = 'ridership_modeling_dumps/'
+# Dumps are exported a year into the generated history, one hour apart per revision
+_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_FIRST_EXPORT = _START + timedelta(days=365)
+
+
+def _timestamp(rng: random.Random, start: datetime) -> str:
+    """Random ISO 8601 timestamp within a year of start"""
+    moment = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _uuid(rng: random.Random) -> str:
+    """Deterministic UUID drawn from rng"""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def exported_at(revision: int = 0) -> datetime:
+    """When the given revision of a synthetic dump was exported"""
+    return _FIRST_EXPORT + timedelta(hours=revision)
+
+
+def dump_key(revision: int = 0) -> str:
+    """S3 key of the given revision of a synthetic dump, named like the real exports"""
+    return f"{DUMP_PREFIX}ridership_modeling_jobs_{exported_at(revision).strftime('%Y%m%d_%H%M%S')}.json"
+
+
+def _generate_projects(rng: random.Random, num_projects: int) -> List[Dict[str, Any]]:
+    num_agencies = max(1, num_projects // 50)
+    num_authors = max(1, num_projects // 10)
+    agencies = [(_uuid(rng), f"Transit Agency {i}") for i in range(num_agencies)]
+    authors = [(rng.randrange(1, 10 ** 6), f"Planner {i}") for i in range(num_authors)]
+
+    projects = []
+    for i in range(num_projects):
+        agency_id, agency_name = rng.choice(agencies)
+        author_id, author_name = rng.choice(authors)
+        created_at = _timestamp(rng, _START)
+        projects.append({
+            'id': _uuid(rng),
+            'name': f"Network Redesign {i} ({rng.choice(['Draft', 'Final', 'Scenario A', 'Scenario B'])})",
+            'agency_id': agency_id,
+            'agency_name': agency_name,
+            'author_id': author_id,
+            'author_name': author_name,
+            'created_at': created_at,
+            'updated_at': max(created_at, _timestamp(rng, _START))
+        })
+    return projects
+
+
+def _generate_job(rng: random.Random, projects: List[Dict[str, Any]], project: Dict[str, Any],
+                  i: int) -> Dict[str, Any]:
+    map_id = _uuid(rng) if rng.random() < 0.9 else None
+    created_at = _timestamp(rng, _START)
+    return {
+        'id': _uuid(rng),
+        'type': 'RidershipModelingJob',
+        'status': rng.choice(STATUSES),
+        'user_id': project['author_id'],
+        'map_id': map_id,
+        'request_payload': {
+            'map_type': rng.choice(MAP_TYPES),
+            'project_id': project['id'],
+            'baseline_project_id': rng.choice(projects)['id'],
+            'map_id': map_id,
+            'service_period_id': _uuid(rng)
+        },
+        'result': {
+            'bytes': rng.randrange(10 ** 4, 10 ** 8),
+            'run_id': _uuid(rng),
+            'status': 'succeeded',
+            'triggered': True,
+            'results_od': f"s3://ridership-results/{i}/od.parquet",
+            'results_stops': f"s3://ridership-results/{i}/stops.parquet",
+            'results_routes': f"s3://ridership-results/{i}/routes.parquet"
+        },
+        'created_at': created_at,
+        'updated_at': created_at
+    }
+
+
+def _iter_jobs(rng: random.Random, projects: List[Dict[str, Any]], num_jobs: int, seed: int, revision: int,
+               changed_fraction: float) -> Iterator[Dict[str, Any]]:
+    """
+    Generate the jobs of a dump one at a time
+
+    Every revision after the first re-runs changed_fraction of the jobs
+    (new status and updated_at) and appends half as many new jobs on top of
+    the previous revision, so consecutive revisions share most ids like
+    consecutive real exports.
+    """
+    revisions = [
+        (random.Random(f"{seed}:{number}"), exported_at(number).strftime('%Y-%m-%dT%H:%M:%SZ'))
+        for number in range(1, revision + 1)
+    ]
+    for i in range(num_jobs):
+        job = _generate_job(rng, projects, projects[i % len(projects)], i)
+        for revision_rng, updated_at in revisions:
+            if revision_rng.random() < changed_fraction:
+                job['status'] = revision_rng.choice(STATUSES)
+                job['updated_at'] = updated_at
+        yield job
+    per_revision = int(num_jobs * changed_fraction / 2)
+    for revision_number in range(1, revision + 1):
+        added_rng = random.Random(f"{seed}:{revision_number}:added")
+        for i in range(per_revision):
+            index = num_jobs + (revision_number - 1) * per_revision + i
+            job = _generate_job(added_rng, projects, added_rng.choice(projects), index)
+            job['created_at'] = job['updated_at'] = exported_at(revision_number).strftime('%Y-%m-%dT%H:%M:%SZ')
+            yield job
+
+
+def added_jobs(num_jobs: int, revision: int, changed_fraction: float) -> int:
+    """Number of jobs the given revision has on top of num_jobs"""
+    return revision * int(num_jobs * changed_fraction / 2)
+
+
+def generate_dump(num_jobs: int = 1000, jobs_per_project: int = 3, seed: int = 0, revision: int = 0,
+                  changed_fraction: float = 0.01) -> Dict[str, Any]:
+    """
+    Generate a dump shaped like the output of dump_ridership_modeling_results
+
+    Args:
+        num_jobs: Number of jobs in the first revision of the export
+        jobs_per_project: Average number of jobs per unique project
+        seed: Random seed, the same seed always produces the same dump
+        revision: Number of exports since the first one; later revisions
+            change and add jobs relative to the first
+        changed_fraction: Fraction of jobs changed by each later revision
+
+    Returns:
+        The dump as a JSON-compatible dict
+    """
+    rng = random.Random(seed)
+    projects = _generate_projects(rng, max(1, num_jobs // max(1, jobs_per_project)))
+    jobs = list(_iter_jobs(rng, projects, num_jobs, seed, revision, changed_fraction))
+    return {
+        'exported_at': exported_at(revision).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'total_jobs': len(jobs),
+        'total_unique_projects': len(projects),
+        'jobs': jobs,
+        'unique_projects': projects
+    }
+
+
+def encode_dump(num_jobs: int = 1000, jobs_per_project: int = 3, seed: int = 0, revision: int = 0,
+                changed_fraction: float = 0.01) -> bytes:
+    """
+    Generate a dump straight to JSON bytes
+
+    Produces the same export as json.dumps(generate_dump(...)) without
+    holding every job as a dict at once, so dumps of a million jobs fit in
+    memory alongside the service being benchmarked.
+    """
+    rng = random.Random(seed)
+    projects = _generate_projects(rng, max(1, num_jobs // max(1, jobs_per_project)))
+    total_jobs = num_jobs + added_jobs(num_jobs, revision, changed_fraction)
+    parts = [
+        f'{{"exported_at": {json.dumps(exported_at(revision).strftime("%Y-%m-%dT%H:%M:%SZ"))}, '
+        f'"total_jobs": {total_jobs}, "total_unique_projects": {len(projects)}, "jobs": ['.encode('utf-8')
+    ]
+    for i, job in enumerate(_iter_jobs(rng, projects, num_jobs, seed, revision, changed_fraction)):
+        if i:
+            parts.append(b', ')
+        parts.append(json.dumps(job).encode('utf-8'))
+    parts.append(b'], "unique_projects": ')
+    parts.append(json.dumps(projects).encode('utf-8'))
+    parts.append(b'}')
+    return b''.join(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic ridership modeling dumps to files")
+    parser.add_argument('--jobs', type=int, default=1000, help="Number of jobs")
+    parser.add_argument('--revisions', type=int, default=1, help="Number of consecutive dumps to write")
+    parser.add_argument('--changed-fraction', type=float, default=0.01, help="Fraction of jobs changed per revision")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--output', default='.', help="Directory to write the dumps to")
+    args = parser.parse_args()
+
+    for revision in range(args.revisions):
+        path = f"{args.output.rstrip('/')}/{dump_key(revision)[len(DUMP_PREFIX):]}"
+        with open(path, 'wb') as f:
+            f.write(encode_dump(args.jobs, seed=args.seed, revision=revision, changed_fraction=args.changed_fraction))
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Tests for the columnar dump store
+"""
+from app.models.ridership import RidershipExport, RidershipJob, UniqueProject
+from app.services.columnar_store import ColumnarExport, TimestampColumn
+
+
+def test_timestamps_round_trip():
+    values = [
+        '2025-01-01T12:00:00Z',
+        '2025-01-02T08:30:15Z',
+        '2025-01-03T00:00:00.123Z',
+        '2025-01-04T00:00:00+01:00',
+        '2025-01-05',
+        '2024-01-01T00:00:00.123456789Z',
+        '2025-01-06T00:00:00,500Z',
+        '2025-01-07 00:00:00Z',
+        '2025-01-08T00:00:00.1Z',
+        '2025-01-09T00:00:00.123456Z',
+        '2025-01-10T00:00:00',
+        'not a timestamp',
+        None
+    ]
+    column = TimestampColumn(values)
+    assert [column[row] for row in range(len(column))] == values
+
+
+def test_short_first_timestamp():
+    values = ['2024-01-01', '2024-01-02T00:00:00.123456Z', '2024-01-03T00:00:00.000001Z']
+    column = TimestampColumn(values)
+    assert [column[row] for row in range(len(column))] == values
+    # The format is learned from the first full timestamp, so later ones are not kept verbatim
+    assert list(column._verbatim) == [0]
+
+
+def test_nanosecond_fraction():
+    column = TimestampColumn(['2024-01-01T00:00:00.123456789Z'])
+    assert column[0] == '2024-01-01T00:00:00.123456789Z'
+    column[0] = '2024-01-01T00:00:01.123456789Z'
+    assert column[0] == '2024-01-01T00:00:01.123456789Z'
+
+
+def test_export_with_unusual_timestamps():
+    data = RidershipExport(
+        jobs=[
+            RidershipJob(id='j1', created_at='2024-01-01', updated_at='2024-01-01T00:00:00.123456789Z'),
+            RidershipJob(id='j2', created_at='2024-01-02T00:00:00Z', updated_at='2024-01-02T00:00:00Z')
+        ],
+        unique_projects=[
+            UniqueProject(id='p1', created_at='2024-01-01', updated_at='2024-01-01T00:00:00.123456789Z')
+        ]
+    )
+    store = ColumnarExport(data)
+    assert store.to_export() == data
@@ -0,0 +1,93 @@
+"""
+Tests for the on-disk dump cache
+"""
+from datetime import datetime, timezone
+import pytest
+from app.models.ridership import RidershipExport, UniqueProject
+from app.services.disk_cache import DiskCache
+
+BUCKET = 'bucket'
+OLD = ('dumps/ridership_modeling_jobs_20250101_000000.json', 'etag-old', datetime(2025, 1, 1, tzinfo=timezone.utc))
+NEW = ('dumps/ridership_modeling_jobs_20250102_000000.json', 'etag-new', datetime(2025, 1, 2, tzinfo=timezone.utc))
+
+
+def _export(name: str) -> RidershipExport:
+    return RidershipExport(unique_projects=[UniqueProject(id='p1', name=name)])
+
+
+def _store(cache: DiskCache, dump, name: str) -> None:
+    key, etag, last_modified = dump
+    cache.store_body(BUCKET, key, etag, {'identity': name.encode('utf-8')})
+    cache.store(BUCKET, key, etag, last_modified, 0.0, _export(name))
+
+
+def test_newer_dump_replaces_older(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    _store(cache, OLD, 'old')
+    old_lock = cache.try_lock(BUCKET, OLD[0], OLD[1])
+    _store(cache, NEW, 'new')
+
+    assert cache.load_latest(BUCKET)['data'] == _export('new')
+    assert cache.load(BUCKET, OLD[0], OLD[1]) is None
+    assert cache.load_body(BUCKET, OLD[0], OLD[1], ['identity']) is None
+    # Lock files are never deleted, so a held lock keeps excluding other workers
+    assert cache.try_lock(BUCKET, OLD[0], OLD[1]) is None
+    cache.release(old_lock)
+
+
+def test_older_dump_stored_late_is_dropped(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    _store(cache, NEW, 'new')
+    _store(cache, OLD, 'old')
+
+    latest = cache.load_latest(BUCKET)
+    assert (latest['key'], latest['data']) == (NEW[0], _export('new'))
+    assert bytes(cache.load_body(BUCKET, NEW[0], NEW[1], ['identity'])['identity']) == b'new'
+    assert cache.load_body(BUCKET, OLD[0], OLD[1], ['identity']) is None
+
+
+def test_restoring_the_same_dump_keeps_it(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    _store(cache, NEW, 'new')
+    key, etag, last_modified = NEW
+    cache.store(BUCKET, key, etag, last_modified, 5.0, _export('new'))
+
+    latest = cache.load_latest(BUCKET)
+    assert latest['checked_at'] == 5.0
+    assert cache.load_body(BUCKET, key, etag, ['identity']) is not None
+
+
+def test_lock_files_of_older_dumps_are_pruned(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    dumps = [(f"dumps/ridership_modeling_jobs_2025010{day}_000000.json", f"etag-{day}",
+              datetime(2025, 1, day, tzinfo=timezone.utc)) for day in range(1, 6)]
+    held = cache.try_lock(BUCKET, *dumps[0][:2])
+    _store(cache, dumps[0], dumps[0][1])
+    for dump in dumps[1:]:
+        lock = cache.try_lock(BUCKET, *dump[:2])
+        _store(cache, dump, dump[1])
+        cache.release(lock)
+
+    # The held lock, and those of the latest and the replaced dump, are kept
+    kept = {cache._lock_path(BUCKET, *dump[:2]).name for dump in (dumps[0], dumps[3], dumps[4])}
+    assert {path.name for path in tmp_path.glob('*-*.lock')} == kept
+    assert len(list(tmp_path.glob('*.latest.lock'))) == 1
+    assert cache.try_lock(BUCKET, *dumps[0][:2]) is None
+    cache.release(held)
+
+    lock = cache.try_lock(BUCKET, *dumps[1][:2])
+    assert lock is not None
+    cache.release(lock)
+
+
+def test_malformed_pointer_is_unreadable(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    _store(cache, NEW, 'new')
+    for pointer in (b'["x"]', b'{"key": "k"}', b'{"key": "k", "etag": "e", "last_modified": 1, "checked_at": 0}'):
+        cache._pointer_path(BUCKET).write_bytes(pointer)
+        with pytest.raises(ValueError):
+            cache.load_latest(BUCKET)
+
+    # A malformed pointer is replaced by the next store
+    _store(cache, OLD, 'old')
+    assert cache.load_latest(BUCKET)['key'] == OLD[0]
@@ -0,0 +1,205 @@
+"""
+Tests for applying deltas between dumps and merging changelog entries
+
+Indexes derived from a delta must answer every lookup and query like an
+index rebuilt from the new dump. Row positions differ between the two (added
+rows are appended, removed ones tombstoned), so rows that tie in a sort order
+may come back in a different order; results are compared up to those ties.
+"""
+import random
+from typing import Dict, List
+from app.models.ridership import RequestPayload, RidershipExport, RidershipJob, UniqueProject
+from app.services.columnar_store import ColumnarExport
+from app.services.dump_delta import DumpDelta, merge_changes
+from app.services.project_index import DIRECTIONS, SORT_FIELDS, ProjectIndex
+
+AGENCIES = [('a1', 'Agency B'), ('a2', 'Agency A'), ('a3', 'Agency C')]
+AUTHORS = [(1, 'Author Y'), (2, 'Author X'), ('3', 'Author Z')]
+
+
+def _project(rng: random.Random, project_id: str) -> UniqueProject:
+    agency_id, agency_name = rng.choice(AGENCIES)
+    author_id, author_name = rng.choice(AUTHORS)
+    return UniqueProject(
+        id=project_id,
+        name=f"Project {rng.randrange(1000)}",
+        agency_id=agency_id,
+        agency_name=agency_name,
+        author_id=author_id,
+        author_name=author_name,
+        created_at=f"2025-01-{rng.randrange(1, 29):02d}T12:00:00Z",
+        updated_at=f"2025-02-{rng.randrange(1, 29):02d}T12:00:00Z"
+    )
+
+
+def _job(rng: random.Random, job_id: str, project_ids: List[str]) -> RidershipJob:
+    return RidershipJob(
+        id=job_id,
+        status='completed',
+        map_id=rng.choice([f"m{rng.randrange(20)}", None]),
+        request_payload=RequestPayload(project_id=rng.choice(project_ids)),
+        created_at=f"2025-03-{rng.randrange(1, 29):02d}T00:00:00Z"
+    )
+
+
+def _first_dump(rng: random.Random) -> RidershipExport:
+    project_ids = [f"p{i}" for i in range(30)]
+    return RidershipExport(
+        exported_at='2025-01-01T00:00:00Z',
+        unique_projects=[_project(rng, project_id) for project_id in project_ids],
+        jobs=[_job(rng, f"j{i}", project_ids + ['orphan']) for i in range(120)]
+    )
+
+
+def _next_dump(rng: random.Random, data: RidershipExport, revision: int) -> RidershipExport:
+    """Change, remove and add a random selection of projects and jobs"""
+    projects = []
+    for project in data.unique_projects:
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        projects.append(_project(rng, project.id) if roll < 0.3 else project)
+    projects += [_project(rng, f"p{revision}-{i}") for i in range(rng.randrange(6))]
+    rng.shuffle(projects)
+
+    project_ids = [project.id for project in projects] + ['orphan']
+    jobs = []
+    for job in data.jobs:
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        jobs.append(_job(rng, job.id, project_ids) if roll < 0.3 else job)
+    jobs += [_job(rng, f"j{revision}-{i}", project_ids) for i in range(rng.randrange(20))]
+    return RidershipExport(exported_at=f"2025-01-{revision + 1:02d}T00:00:00Z", unique_projects=projects, jobs=jobs)
+
+
+def _by_id(records: List) -> Dict[str, object]:
+    return {record.id: record for record in records}
+
+
+def _sort_value(project: UniqueProject, sort_by: str) -> str:
+    return str(getattr(project, SORT_FIELDS[sort_by]) or '')
+
+
+def _assert_equivalent(applied: ProjectIndex, rebuilt: ProjectIndex, data: RidershipExport) -> None:
+    project_ids = [project.id for project in data.unique_projects]
+    job_project_ids = {job.project_id for job in data.jobs} | {'orphan', 'missing'}
+
+    # The store holds exactly the records of the new dump
+    export = applied.store.to_export()
+    assert _by_id(export.unique_projects) == _by_id(data.unique_projects)
+    assert _by_id(export.jobs) == _by_id(data.jobs)
+    assert export.exported_at == data.exported_at
+
+    # Job and map id lookups
+    for project_id in project_ids + sorted(job_project_ids - {None}):
+        assert applied.has_project(project_id) == rebuilt.has_project(project_id)
+        assert _by_id(applied.jobs_for_project(project_id)) == _by_id(rebuilt.jobs_for_project(project_id))
+    assert applied.map_ids_for_projects(project_ids) == rebuilt.map_ids_for_projects(project_ids)
+    for project_id in project_ids[:5]:
+        assert applied.map_ids_for_projects([project_id]) == rebuilt.map_ids_for_projects([project_id])
+
+    # Sort orders and agency/author filters, up to the order of tied rows
+    filters = [{}] + [{'agency_id': agency_id} for agency_id, _ in AGENCIES] + \
+        [{'author_id': str(author_id)} for author_id, _ in AUTHORS] + \
+        [{'agency_id': 'a1', 'author_id': '1'}, {'agency_id': 'unknown'}, {'created_after': 1736900000000000}]
+    for sort_by in SORT_FIELDS:
+        for direction in DIRECTIONS:
+            for query_filter in filters:
+                expected = rebuilt.query(sort_by, direction, limit=1000, **query_filter)
+                actual = applied.query(sort_by, direction, limit=1000, **query_filter)
+                assert actual['total'] == expected['total']
+                assert _by_id(actual['projects']) == _by_id(expected['projects'])
+                assert [_sort_value(project, sort_by) for project in actual['projects']] == \
+                    [_sort_value(project, sort_by) for project in expected['projects']]
+
+                # Pages cover the same rows as the single full page
+                page = applied.query(sort_by, direction, limit=7, **query_filter)
+                paged = list(page['projects'])
+                while page['next'] is not None:
+                    page = applied.query(sort_by, direction, start=page['next'], limit=7, **query_filter)
+                    paged += page['projects']
+                assert [project.id for project in paged] == [project.id for project in actual['projects']]
+
+
+def test_applied_delta_matches_rebuild():
+    for seed in range(20):
+        rng = random.Random(seed)
+        data = _first_dump(rng)
+        index = ProjectIndex(ColumnarExport(data))
+        # Consecutive deltas, so tombstones and appended rows accumulate
+        for revision in range(1, 5):
+            data = _next_dump(rng, data, revision)
+            delta = DumpDelta.between(index.store, data)
+            assert delta is not None
+            store = delta.apply()
+            index = index.apply(delta, store)
+            _assert_equivalent(index, ProjectIndex(ColumnarExport(data)), data)
+
+
+def test_applying_a_delta_leaves_the_previous_index_untouched():
+    rng = random.Random(0)
+    data = _first_dump(rng)
+    index = ProjectIndex(ColumnarExport(data))
+    before = index.query('name', 'asc', limit=1000)
+
+    next_data = _next_dump(rng, data, 1)
+    delta = DumpDelta.between(index.store, next_data)
+    index.apply(delta, delta.apply())
+
+    assert index.query('name', 'asc', limit=1000) == before
+    _assert_equivalent(index, ProjectIndex(ColumnarExport(data)), data)
+
+
+def test_repeated_id_cannot_be_diffed():
+    rng = random.Random(0)
+    data = _first_dump(rng)
+    store = ColumnarExport(data)
+    repeated = RidershipExport(unique_projects=data.unique_projects + data.unique_projects[:1], jobs=data.jobs)
+    assert DumpDelta.between(store, repeated) is None
+
+
+def _change(kind: str, added=(), changed=(), removed=()) -> Dict[str, Dict[str, List]]:
+    empty = {'added': [], 'changed': [], 'removed': []}
+    change = {'projects': dict(empty), 'jobs': dict(empty)}
+    change[kind] = {'added': list(added), 'changed': list(changed), 'removed': list(removed)}
+    return change
+
+
+def test_merge_added_then_removed():
+    project = UniqueProject(id='p1', name='New')
+    merged = merge_changes([
+        _change('projects', added=[project]),
+        _change('projects', removed=['p1'])
+    ])
+    assert merged['projects'] == {'added': [], 'modified': [], 'removed': []}
+    assert merged['jobs'] == {'added': [], 'modified': [], 'removed': []}
+
+
+def test_merge_removed_then_added():
+    project = UniqueProject(id='p1', name='Back')
+    merged = merge_changes([
+        _change('projects', removed=['p1']),
+        _change('projects', added=[project])
+    ])
+    assert merged['projects'] == {'added': [], 'modified': [project], 'removed': []}
+
+
+def test_merge_keeps_the_latest_record():
+    first = RidershipJob(id='j1', status='queued')
+    second = RidershipJob(id='j1', status='completed')
+    changed = RidershipJob(id='j2', status='completed')
+    merged = merge_changes([
+        _change('jobs', added=[first], changed=[RidershipJob(id='j2', status='running')]),
+        _change('jobs', changed=[second, changed]),
+    ])
+    assert merged['jobs'] == {'added': [second], 'modified': [changed], 'removed': []}
+
+
+def test_merge_changed_then_removed():
+    merged = merge_changes([
+        _change('projects', changed=[UniqueProject(id='p1', name='Renamed')]),
+        _change('projects', removed=['p1']),
+        _change('projects', removed=['p2'])
+    ])
+    assert merged['projects'] == {'added': [], 'modified': [], 'removed': ['p1', 'p2']}
@@ -76,6 +76,13 @@ const ProjectsGrid: React.FC<ProjectsGridProps> = ({ className = '' }) => {
     fetchProjects();
   }, [environment]);
 
+  useEffect(() => {
+    // Refresh in the background when the backend announces a new dump, instead of polling
+    return projectsApi.subscribeToDumps(environment, () => {
+      fetchProjects(false);
+    });
+  }, [environment]);
+
   useEffect(() => {
     // Close dropdown when clicking outside
     const handleClickOutside = (event: MouseEvent) => {
@@ -115,9 +122,11 @@ const ProjectsGrid: React.FC<ProjectsGridProps> = ({ className = '' }) => {
     updateUrlParams({ selectedProjects });
   }, [selectedProjects]);
 
-  const fetchProjects = async () => {
+  const fetchProjects = async (showLoading = true) => {
     try {
-      setLoading(true);
+      if (showLoading) {
+        setLoading(true);
+      }
       setError(null);
       
       const response = await projectsApi.getProjects(environment);
@@ -158,22 +167,26 @@ const ProjectsGrid: React.FC<ProjectsGridProps> = ({ className = '' }) => {
     setSelectedProjects(new Set());
   };
 
-  const getUniqueMapIds = (): string[] => {
-    if (!data?.projects.jobs || selectedProjects.size === 0) return [];
-    
-    const mapIds = new Set<string>();
-    
-    // Find all jobs that belong to selected projects
-    data.projects.jobs.forEach(job => {
-      if (selectedProjects.has(job.request_payload.project_id) && job.map_id) {
-        mapIds.add(job.map_id);
+  const [uniqueMapIds, setUniqueMapIds] = useState<string[]>([]);
+
+  useEffect(() => {
+    if (!data || selectedProjects.size === 0) {
+      setUniqueMapIds([]);
+      return;
+    }
+
+    // Map ids are looked up from the backend's project index
+    let cancelled = false;
+    projectsApi.getMapIds(Array.from(selectedProjects), environment).then(response => {
+      if (!cancelled) {
+        setUniqueMapIds(response.success && response.data ? response.data.mapIds : []);
       }
     });
-    
-    return Array.from(mapIds).sort();
-  };
 
-  const uniqueMapIds = getUniqueMapIds();
+    return () => {
+      cancelled = true;
+    };
+  }, [data, selectedProjects, environment]);
 
   const sortedProjects = React.useMemo(() => {
     if (!data?.projects.unique_projects) return [];
@@ -374,7 +387,7 @@ const ProjectsGrid: React.FC<ProjectsGridProps> = ({ className = '' }) => {
         </div>
         <div className="mt-4">
           <button
-            onClick={fetchProjects}
+            onClick={() => fetchProjects()}
             className="bg-red-100 hover:bg-red-200 text-red-800 px-4 py-2 rounded-md text-sm font-medium"
           >
             Try Again
@@ -407,10 +420,15 @@ const ProjectsGrid: React.FC<ProjectsGridProps> = ({ className = '' }) => {
                 </p>
               </div>
               <div className="flex items-center space-x-2">
-                <span className={`inline-flex items-center px-2 py-0.5 rounded-full text-xs font-medium ${
-                  data.fromCache ? 'bg-green-100 text-green-800' : 'bg-blue-100 text-blue-800'
-                }`}>
-                  {data.fromCache ? 'Cached' : 'Fresh'}
+                <span
+                  className={`inline-flex items-center px-2 py-0.5 rounded-full text-xs font-medium ${
+                    data.stale
+                      ? 'bg-yellow-100 text-yellow-800'
+                      : data.fromCache ? 'bg-green-100 text-green-800' : 'bg-blue-100 text-blue-800'
+                  }`}
+                  title={`Last checked against S3: ${new Date(data.checkedAt).toLocaleString()}`}
+                >
+                  {data.stale ? 'Stale' : data.fromCache ? 'Cached' : 'Fresh'}
                 </span>
                 
                 {/* Three Dots Menu */}
@@ -459,7 +477,7 @@ const ProjectsGrid: React.FC<ProjectsGridProps> = ({ className = '' }) => {
                 </div>
                 
                 <button
-                  onClick={fetchProjects}
+                  onClick={() => fetchProjects()}
                   className="bg-blue-600 hover:bg-blue-700 text-white px-3 py-1 rounded-md text-sm font-medium"
                 >
                   Refresh
@@ -2,7 +2,19 @@
  * API client for communicating with the FastAPI backend
  */
 import axios from 'axios';
-import type { ProjectsResponse } from '../types/api';
+import type { AxiosResponse } from 'axios';
+import type {
+  DumpEvent,
+  MapIdsResponse,
+  ProjectChanges,
+  ProjectChangesResponse,
+  ProjectJobsResponse,
+  ProjectQueryParams,
+  ProjectsData,
+  ProjectsPageResponse,
+  ProjectsResponse,
+  RecordChanges
+} from '../types/api';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
@@ -36,20 +48,245 @@ apiClient.interceptors.response.use(
   }
 );
 
+/**
+ * Read a response header as a string
+ */
+const getHeader = (response: AxiosResponse, name: string): string | undefined => {
+  const value = response.headers[name];
+  return value === undefined || value === null ? undefined : String(value);
+};
+
+interface CachedProjects {
+  etag?: string;
+  lastModified?: string;
+  response: ProjectsResponse;
+}
+
+// Last successful /api/projects response per environment, used for conditional requests
+const projectsCache: Partial<Record<'local' | 'production', CachedProjects>> = {};
+
+// getProjects calls still running per environment
+const pendingProjects: Partial<Record<'local' | 'production', Promise<ProjectsResponse>>> = {};
+
+/**
+ * Apply added, modified and removed records to a list of records
+ */
+const patchRecords = <T extends { id: string }>(records: T[], changes: RecordChanges<T>): T[] => {
+  if (!changes.added.length && !changes.modified.length && !changes.removed.length) {
+    return records;
+  }
+  const removed = new Set(changes.removed);
+  const modified = new Map(changes.modified.map((record): [string, T] => [record.id, record]));
+  return records
+    .filter((record) => !removed.has(record.id))
+    .map((record) => modified.get(record.id) ?? record)
+    .concat(changes.added);
+};
+
+/**
+ * Patch a previously downloaded export with the changes made since
+ */
+const applyChanges = (
+  projects: ProjectsData['projects'],
+  changes: ProjectChanges
+): ProjectsData['projects'] => ({
+  ...projects,
+  exported_at: changes.exportedAt ?? projects.exported_at,
+  total_jobs: changes.totalJobs ?? projects.total_jobs,
+  total_unique_projects: changes.totalUniqueProjects ?? projects.total_unique_projects,
+  jobs: patchRecords(projects.jobs, changes.jobs),
+  unique_projects: patchRecords(projects.unique_projects, changes.projects)
+});
+
+/**
+ * Fill in the freshness of a projects response from the X-Cache, Age and X-Checked-At headers
+ */
+const applyFreshness = (result: ProjectsResponse, response: AxiosResponse): void => {
+  if (result.success && result.data) {
+    result.data.fromCache = getHeader(response, 'x-cache') !== 'MISS';
+    result.data.stale = getHeader(response, 'x-cache') === 'STALE';
+    result.data.ageSeconds = Number(getHeader(response, 'age') ?? 0);
+    result.data.checkedAt = getHeader(response, 'x-checked-at') ?? result.data.lastModified;
+  }
+};
+
+/**
+ * Bring a cached export up to date through /api/projects/changes
+ *
+ * Returns undefined when the backend no longer has the changes since the
+ * cached dump, in which case the whole export has to be downloaded again.
+ */
+const fetchChanges = async (
+  environment: 'local' | 'production',
+  cached: CachedProjects
+): Promise<ProjectsResponse | undefined> => {
+  const cachedData = cached.response.data;
+  if (!cached.etag || !cachedData) {
+    return undefined;
+  }
+
+  const response = await apiClient.get<ProjectChangesResponse>('/api/projects/changes', {
+    params: { environment, since: cached.etag },
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 410
+  });
+  const changes = response.data.data;
+  if (response.status === 410 || !response.data.success || !changes) {
+    return undefined;
+  }
+
+  const result: ProjectsResponse = {
+    ...cached.response,
+    data: {
+      ...cachedData,
+      projects: applyChanges(cachedData.projects, changes),
+      lastModified: changes.lastModified,
+      sourceFile: changes.sourceFile
+    }
+  };
+  applyFreshness(result, response);
+  projectsCache[environment] = {
+    etag: getHeader(response, 'etag'),
+    lastModified: getHeader(response, 'last-modified'),
+    response: result
+  };
+  return result;
+};
+
+/**
+ * Download the export of an environment, or bring the cached one up to date
+ */
+const loadProjects = async (environment: 'local' | 'production'): Promise<ProjectsResponse> => {
+  try {
+    const cached = projectsCache[environment];
+    if (cached) {
+      const patched = await fetchChanges(environment, cached);
+      if (patched) {
+        return { ...patched, data: patched.data && { ...patched.data } };
+      }
+    }
+
+    // Revalidate the last response instead of downloading the dump again
+    const headers: Record<string, string> = {};
+    if (cached?.etag) {
+      headers['If-None-Match'] = cached.etag;
+    } else if (cached?.lastModified) {
+      headers['If-Modified-Since'] = cached.lastModified;
+    }
+
+    const response = await apiClient.get<ProjectsResponse>('/api/projects', {
+      params: { environment },
+      headers,
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304
+    });
+
+    const notModified = response.status === 304 && cached !== undefined;
+    const result: ProjectsResponse = notModified
+      ? { ...cached.response, data: cached.response.data && { ...cached.response.data } }
+      : response.data;
+
+    // Freshness is sent in headers so the body can be encoded once per dump
+    applyFreshness(result, response);
+
+    if (!notModified && result.success) {
+      projectsCache[environment] = {
+        etag: getHeader(response, 'etag'),
+        lastModified: getHeader(response, 'last-modified'),
+        response: result
+      };
+    }
+    return result;
+  } catch (error) {
+    console.error('Error fetching projects:', error);
+    
+    // Return a properly formatted error response
+    return {
+      success: false,
+      error: error instanceof Error ? error.message : 'Unknown error occurred'
+    };
+  }
+};
+
 export const projectsApi = {
   /**
    * Fetch all projects from the backend
+   *
+   * Once an export has been downloaded, later calls only fetch the changes
+   * made since and patch it, falling back to a (conditional) full download.
    */
   async getProjects(environment: 'local' | 'production' = 'local'): Promise<ProjectsResponse> {
+    const pending = loadProjects(environment);
+    pendingProjects[environment] = pending;
+    try {
+      return await pending;
+    } finally {
+      if (pendingProjects[environment] === pending) {
+        delete pendingProjects[environment];
+      }
+    }
+  },
+
+  /**
+   * Fetch one page of projects, filtered and sorted by the backend
+   */
+  async queryProjects(
+    environment: 'local' | 'production' = 'local',
+    params: ProjectQueryParams = {}
+  ): Promise<ProjectsPageResponse> {
     try {
-      const response = await apiClient.get<ProjectsResponse>('/api/projects', {
-        params: { environment }
+      const response = await apiClient.get<ProjectsPageResponse>('/api/projects/query', {
+        params: { environment, ...params }
       });
       return response.data;
     } catch (error) {
-      console.error('Error fetching projects:', error);
-      
-      // Return a properly formatted error response
+      console.error('Error querying projects:', error);
+
+      return {
+        success: false,
+        error: error instanceof Error ? error.message : 'Unknown error occurred'
+      };
+    }
+  },
+
+  /**
+   * Fetch the jobs and map ids of a single project
+   */
+  async getProjectJobs(
+    projectId: string,
+    environment: 'local' | 'production' = 'local'
+  ): Promise<ProjectJobsResponse> {
+    try {
+      const response = await apiClient.get<ProjectJobsResponse>(
+        `/api/projects/${encodeURIComponent(projectId)}/jobs`,
+        { params: { environment } }
+      );
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching project jobs:', error);
+
+      return {
+        success: false,
+        error: error instanceof Error ? error.message : 'Unknown error occurred'
+      };
+    }
+  },
+
+  /**
+   * Fetch the distinct map ids used by a batch of projects
+   */
+  async getMapIds(
+    projectIds: string[],
+    environment: 'local' | 'production' = 'local'
+  ): Promise<MapIdsResponse> {
+    try {
+      const response = await apiClient.post<MapIdsResponse>(
+        '/api/map-ids',
+        { projectIds },
+        { params: { environment } }
+      );
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching map ids:', error);
+
       return {
         success: false,
         error: error instanceof Error ? error.message : 'Unknown error occurred'
@@ -57,6 +294,37 @@ export const projectsApi = {
     }
   },
 
+  /**
+   * Subscribe to the new-dump events the backend pushes over Server-Sent Events
+   *
+   * The callback only fires for dumps other than the one last fetched with
+   * getProjects, once any getProjects call for the environment has finished;
+   * events before the first export is cached are ignored. Returns a function
+   * that closes the subscription.
+   */
+  subscribeToDumps(
+    environment: 'local' | 'production',
+    onNewDump: (event: DumpEvent) => void
+  ): () => void {
+    const source = new EventSource(
+      `${API_BASE_URL}/api/projects/events?environment=${encodeURIComponent(environment)}`
+    );
+    let closed = false;
+    source.addEventListener('dump', async (message) => {
+      const event = JSON.parse((message as MessageEvent<string>).data) as DumpEvent;
+      // The current dump is announced on connect, usually while the first download is still running
+      await pendingProjects[environment];
+      const cached = projectsCache[environment];
+      if (!closed && cached && cached.etag !== `W/"${event.etag}"`) {
+        onNewDump(event);
+      }
+    });
+    return () => {
+      closed = true;
+      source.close();
+    };
+  },
+
   /**
    * Check if the API is healthy
    */
@@ -56,7 +56,81 @@ export interface ProjectsData {
   lastModified: string;
   totalCount: number;
   sourceFile: string;
+  // Filled in from the X-Cache, X-Checked-At and Age response headers
   fromCache: boolean;
+  stale: boolean;
+  checkedAt: string;
+  ageSeconds: number;
 }
 
-export type ProjectsResponse = ApiResponse<ProjectsData>; 
\ No newline at end of file
+export type ProjectsResponse = ApiResponse<ProjectsData>; 
+
+export type ProjectSortBy = 'name' | 'agency' | 'author' | 'created_at' | 'updated_at';
+
+export interface ProjectQueryParams {
+  limit?: number;
+  cursor?: string;
+  sort_by?: ProjectSortBy;
+  direction?: 'asc' | 'desc';
+  agency_id?: string;
+  author_id?: string;
+  created_after?: string;
+  created_before?: string;
+  updated_after?: string;
+  updated_before?: string;
+}
+
+export interface ProjectsPage {
+  projects: UniqueProject[];
+  totalCount: number;
+  nextCursor: string | null;
+  lastModified: string;
+  sourceFile: string;
+  fromCache: boolean;
+  stale: boolean;
+}
+
+export type ProjectsPageResponse = ApiResponse<ProjectsPage>;
+
+export interface ProjectJobs {
+  projectId: string;
+  jobs: RidershipJob[];
+  mapIds: string[];
+}
+
+export type ProjectJobsResponse = ApiResponse<ProjectJobs>;
+
+export type MapIdsResponse = ApiResponse<{ mapIds: string[] }>;
+
+export interface RecordChanges<T> {
+  added: T[];
+  modified: T[];
+  removed: string[];
+}
+
+export interface ProjectChanges {
+  since: string;
+  etag: string;
+  exportedAt: string | null;
+  totalJobs: number | null;
+  totalUniqueProjects: number | null;
+  lastModified: string;
+  sourceFile: string;
+  projects: RecordChanges<UniqueProject>;
+  jobs: RecordChanges<RidershipJob>;
+}
+
+export type ProjectChangesResponse = ApiResponse<ProjectChanges>;
+
+export interface DumpEvent {
+  environment: 'local' | 'production';
+  key: string;
+  etag: string;
+  exportedAt: string | null;
+  lastModified: string;
+  projectCount: number;
+  jobCount: number;
+  // Only on dumps loaded after the connection was opened, when a delta is known
+  changes?: Record<'projects' | 'jobs', { added: number; changed: number; removed: number }>;
+  delta?: Record<'projects', RecordChanges<UniqueProject>> & Record<'jobs', RecordChanges<RidershipJob>>;
+}